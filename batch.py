@@ -0,0 +1,121 @@
+import argparse
+import itertools
+import json
+import statistics
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# spawner variant of the entities that can be added with --lights / --enemies / --shadows
+EXTRA_VARIANTS = {'lights': 1, 'enemies': 3, 'shadows': 4}
+
+
+def frame_stats(frame_times):
+    if not frame_times:
+        return {'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0, 'fps': 0.0}
+    times = sorted(t * 1000 for t in frame_times)
+    mean = statistics.fmean(times)
+    return {'mean_ms': mean,
+            'p50_ms': times[len(times) // 2],
+            'p95_ms': times[min(len(times) - 1, int(len(times) * 0.95))],
+            'p99_ms': times[min(len(times) - 1, int(len(times) * 0.99))],
+            'max_ms': times[-1],
+            'fps': 1000 / mean if mean else 0.0}
+
+
+# runs in a worker process: one headless game session, returns its statistics
+def run_simulation(job):
+    from game import Game   # imported here so the main process never initializes pygame
+
+    game = Game(seed=job['seed'], headless=True, replay=job['replay'])
+    game.level = job['level']
+    game.level_maps[job['level']] = job['map']
+    game.extra_entities = {EXTRA_VARIANTS[name]: count for name, count in job['extra'].items() if count}
+    game.profile = True
+    game.run(max_frames=job['frames'])
+
+    result = dict(job)
+    result.update(frame_stats(game.frame_times))
+    result.update({'frames_run': game.frame,
+                   'level_reached': game.level,
+                   'pictures_taken': game.pictures_taken,
+                   'capturable': game.nr_light_and_shadow,
+                   'capture_rate': game.pictures_taken / game.nr_light_and_shadow if game.nr_light_and_shadow else 0.0,
+                   'captures': game.captures,
+                   'deaths': game.deaths})
+    return result
+
+
+def make_jobs(args):
+    jobs = []
+    counts = [args.lights, args.enemies, args.shadows]
+    for map_path, seed, lights, enemies, shadows in itertools.product(args.maps, args.seeds, *counts):
+        jobs.append({'map': map_path, 'level': args.level, 'seed': seed, 'frames': args.frames, 'replay': args.replay,
+                     'extra': {'lights': lights, 'enemies': enemies, 'shadows': shadows}})
+    return jobs
+
+
+# totals per map and entity counts (over all seeds)
+def summarize(results):
+    groups = {}
+    for result in results:
+        key = (result['map'], tuple(sorted(result['extra'].items())))
+        groups.setdefault(key, []).append(result)
+
+    summary = []
+    for (map_path, extra), group in sorted(groups.items()):
+        summary.append({'map': map_path,
+                        'extra': dict(extra),
+                        'runs': len(group),
+                        'mean_ms': statistics.fmean(r['mean_ms'] for r in group),
+                        'p95_ms': max(r['p95_ms'] for r in group),
+                        'max_ms': max(r['max_ms'] for r in group),
+                        'capture_rate': statistics.fmean(r['capture_rate'] for r in group),
+                        'captures': sum(r['captures'] for r in group),
+                        'deaths': sum(r['deaths'] for r in group)})
+    return summary
+
+
+def print_report(results, summary):
+    row = '{:<20} {:>6} {:>16} {:>7} {:>8} {:>8} {:>8} {:>7} {:>8} {:>6}'
+    print(row.format('map', 'seed', 'extra l/e/s', 'frames', 'mean ms', 'p95 ms', 'max ms', 'fps', 'captured', 'deaths'))
+    for r in results:
+        extra = '{lights}/{enemies}/{shadows}'.format(**r['extra'])
+        print(row.format(r['map'][-20:], r['seed'], extra, r['frames_run'], f"{r['mean_ms']:.2f}", f"{r['p95_ms']:.2f}",
+                         f"{r['max_ms']:.2f}", f"{r['fps']:.0f}", f"{r['pictures_taken']}/{r['capturable']}", r['deaths']))
+
+    print()
+    row = '{:<20} {:>16} {:>5} {:>8} {:>8} {:>8} {:>9} {:>6}'
+    print(row.format('map', 'extra l/e/s', 'runs', 'mean ms', 'p95 ms', 'max ms', 'capture %', 'deaths'))
+    for s in summary:
+        extra = '{lights}/{enemies}/{shadows}'.format(**s['extra'])
+        print(row.format(s['map'][-20:], extra, s['runs'], f"{s['mean_ms']:.2f}", f"{s['p95_ms']:.2f}", f"{s['max_ms']:.2f}",
+                         f"{s['capture_rate'] * 100:.1f}", s['deaths']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run many headless game sessions in parallel and report frame times, captures and deaths')
+    parser.add_argument('--maps', nargs='+', default=['map-big2.json'], help='map files to simulate')
+    parser.add_argument('--level', type=int, default=0, help='level logic the maps are played with (0, 1 or 2)')
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0])
+    parser.add_argument('--lights', nargs='+', type=int, default=[0], help='additional light entities per level load')
+    parser.add_argument('--enemies', nargs='+', type=int, default=[0], help='additional enemies per level load')
+    parser.add_argument('--shadows', nargs='+', type=int, default=[0], help='additional shadow entities per level load')
+    parser.add_argument('--frames', type=int, default=3600, help='frames per session (ends earlier when a replay ends)')
+    parser.add_argument('--replay', help='replay file used as player input for every session')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: cpu count)')
+    parser.add_argument('--out', help='write the full report as json')
+    args = parser.parse_args()
+
+    jobs = make_jobs(args)
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(run_simulation, job) for job in jobs]
+        for future in as_completed(futures):
+            results.append(future.result())
+            print(f'{len(results)}/{len(jobs)} sessions done', flush=True)
+    results.sort(key=lambda r: (r['map'], r['seed'], sorted(r['extra'].items())))
+
+    summary = summarize(results)
+    print_report(results, summary)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'sessions': results, 'summary': summary}, f, indent=2)
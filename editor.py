@@ -4,8 +4,15 @@ import pygame
 
 from scripts.utils import load_images
 from scripts.tilemap import Tilemap
+from scripts.chunks import ChunkRenderer, OVERVIEW_SCALE
+from scripts.picking import OffgridPicker
+from scripts.history import History
+from scripts.saving import MapSaver
+from scripts.records import Tile
 
 RENDER_SCALE = 4.0
+MAP_PATH = 'map-big1.json'      # a path without .json is saved in the chunked format (only edited chunks are rewritten)
+FLOOD_LIMIT = 20000     # cells, flood fills of larger (or unbounded) regions are refused
 
 
 class Editor:
@@ -38,13 +45,23 @@ class Editor:
 
         # load tilemap if file is found
         try:
-            self.tilemap.load('map-big1.json')
+            self.tilemap.load(MAP_PATH)
             # self.tilemap.load('map-debug.json')
         except FileNotFoundError:
             pass
 
+        # pre-rendered map chunks, redrawn only where the map was edited
+        self.chunks = ChunkRenderer(self.tilemap)
+        # bounding box index for hovering, selecting and deleting offgrid tiles
+        self.picker = OffgridPicker(self.tilemap)
+        # undo (ctrl + z) / redo (ctrl + y) of the edits
+        self.history = History(self.tilemap)
+        # saving on a worker thread (o) and autosave
+        self.saver = MapSaver(self.tilemap, MAP_PATH)
+
         # camera position
         self.cam = [0, 0]
+        self.zoom = 1       # OVERVIEW_SCALE when zoomed out (toggle with z)
 
         self.tile_list = list(self.assets)
         self.tile_group = 0
@@ -56,44 +73,165 @@ class Editor:
         self.strg = False
         self.ongrid = True
 
+        # bulk editing: shift + left / right drag fills / erases a rectangle, middle drag selects a region for copy (c) and paste (v)
+        self.rect_start = None      # cell where the current rectangle drag started
+        self.rect_button = None
+        self.selection = None       # (corner, corner) cells of the selected region
+        self.selected = []          # selected offgrid tiles (alt + click toggles, region selection adds, delete removes them)
+        self.alt = False
+        self.clipboard = None       # copied region relative to its top left cell
+
+    # cells of the rectangle spanned by two corner cells
+    def rect_cells(self, a, b):
+        return [(x, y) for x in range(min(a[0], b[0]), max(a[0], b[0]) + 1) for y in range(min(a[1], b[1]), max(a[1], b[1]) + 1)]
+
+    # the rectangle in pixels
+    def rect_area(self, a, b):
+        size = self.tilemap.tile_size
+        return pygame.Rect(min(a[0], b[0]) * size, min(a[1], b[1]) * size, (abs(a[0] - b[0]) + 1) * size, (abs(a[1] - b[1]) + 1) * size)
+
+    def fill_rect(self, a, b):
+        tile_type = self.tile_list[self.tile_group]
+        self.tilemap.set_tiles({cell: Tile(tile_type, self.tile_variant, cell) for cell in self.rect_cells(a, b)})
+
+    # offgrid tiles placed inside the rectangle
+    def offgrid_in_rect(self, a, b):
+        area = self.rect_area(a, b)
+        return [tile for tile in self.picker.in_rect(area) if area.collidepoint(tile.pos)]
+
+    # removes grid tiles and offgrid tiles placed inside the rectangle
+    def erase_rect(self, a, b):
+        self.tilemap.set_tiles({cell: None for cell in self.rect_cells(a, b)})
+        self.remove_offgrids(self.offgrid_in_rect(a, b))
+
+    # remove offgrid tiles, also from the selection
+    def remove_offgrids(self, tiles):
+        removed = {id(tile) for tile in tiles}
+        self.selected = [tile for tile in self.selected if id(tile) not in removed]
+        self.tilemap.remove_offgrids(tiles)
+
+    def toggle_selected(self, tile):
+        if any(selected is tile for selected in self.selected):
+            self.selected = [selected for selected in self.selected if selected is not tile]
+        else:
+            self.selected.append(tile)
+
+    # outline of an offgrid tile on the display
+    def draw_outline(self, tile, color, render_scroll):
+        r = self.picker.rect(tile)
+        pygame.draw.rect(self.display, color, ((r.x - render_scroll[0]) // self.zoom, (r.y - render_scroll[1]) // self.zoom,
+                                               max(1, r.width // self.zoom), max(1, r.height // self.zoom)), 1)
+
+    # fill the region of connected cells with the same tile type as start (or connected empty cells)
+    def flood_fill(self, start):
+        def type_at(cell):
+            tile = self.tilemap.tilemap.get(str(cell[0]) + ';' + str(cell[1]))
+            return tile.type if tile is not None else None
+
+        tile_type = self.tile_list[self.tile_group]
+        target = type_at(start)
+        if target == tile_type:
+            return
+        region = {start}
+        stack = [start]
+        while stack:
+            cell = stack.pop()
+            for shift in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+                neighbor = (cell[0] + shift[0], cell[1] + shift[1])
+                if neighbor not in region and type_at(neighbor) == target:
+                    region.add(neighbor)
+                    stack.append(neighbor)
+            if len(region) > FLOOD_LIMIT:
+                print('flood fill region is too large')
+                return
+        self.tilemap.set_tiles({cell: Tile(tile_type, self.tile_variant, cell) for cell in region})
+
+    # copy grid and offgrid tiles of the region, positions relative to its top left corner
+    def copy_region(self, a, b):
+        origin = (min(a[0], b[0]), min(a[1], b[1]))
+        size = self.tilemap.tile_size
+        grid = []
+        for cell in self.rect_cells(a, b):
+            tile = self.tilemap.tilemap.get(str(cell[0]) + ';' + str(cell[1]))
+            if tile is not None:
+                grid.append(Tile(tile.type, tile.variant, (cell[0] - origin[0], cell[1] - origin[1])))
+        offgrid = [Tile(tile.type, tile.variant, (tile.pos[0] - origin[0] * size, tile.pos[1] - origin[1] * size))
+                   for tile in self.offgrid_in_rect(a, b)]
+        self.clipboard = {'grid': grid, 'offgrid': offgrid}
+
+    # paste the clipboard with its top left corner at cell
+    def paste(self, cell):
+        if self.clipboard is None:
+            return
+        size = self.tilemap.tile_size
+        changes = {}
+        for tile in self.clipboard['grid']:
+            loc = (tile.pos[0] + cell[0], tile.pos[1] + cell[1])
+            changes[loc] = Tile(tile.type, tile.variant, loc)
+        self.tilemap.set_tiles(changes)
+        self.tilemap.add_offgrids([Tile(tile.type, tile.variant, (tile.pos[0] + cell[0] * size, tile.pos[1] + cell[1] * size))
+                                   for tile in self.clipboard['offgrid']])
+
+    # outline of a cell rectangle on the display
+    def draw_rect(self, a, b, color, render_scroll):
+        area = self.rect_area(a, b)
+        pygame.draw.rect(self.display, color, ((area.x - render_scroll[0]) // self.zoom, (area.y - render_scroll[1]) // self.zoom,
+                                               area.width // self.zoom, area.height // self.zoom), 1)
 
     def run(self):
         while True:
             self.display.fill((0, 0, 0))    # reset screen
 
-            # camera movement
-            self.cam[0] += (self.movement[1] - self.movement[0]) * 2
-            self.cam[1] += (self.movement[3] - self.movement[2]) * 2
+            # camera movement (faster when zoomed out)
+            self.cam[0] += (self.movement[1] - self.movement[0]) * 2 * self.zoom
+            self.cam[1] += (self.movement[3] - self.movement[2]) * 2 * self.zoom
 
             render_scroll = (int(self.cam[0]), int(self.cam[1]))
 
-            self.tilemap.render(self.display, offset=render_scroll)
+            if self.zoom == 1:
+                self.chunks.render(self.display, offset=render_scroll)
+            else:
+                self.chunks.render_overview(self.display, offset=render_scroll, scale=self.zoom)
 
             current_tile_img = self.assets[self.tile_list[self.tile_group]][self.tile_variant]
             current_tile_img.set_alpha(100)     # make slightly transparent (0 - 255)
 
             mouse_position = pygame.mouse.get_pos()     # get mouse position (based on window)
-            mouse_position = (mouse_position[0] / RENDER_SCALE, mouse_position[1] / RENDER_SCALE)   # adjust position by render scale
+            mouse_position = (mouse_position[0] / RENDER_SCALE * self.zoom, mouse_position[1] / RENDER_SCALE * self.zoom)   # adjust position by render scale and zoom
             tile_pos = (int((mouse_position[0] + self.cam[0]) // self.tilemap.tile_size), int((mouse_position[1] + self.cam[1]) // self.tilemap.tile_size))
 
-            if self.ongrid:
+            if self.zoom != 1:
+                # outline of the hovered cell, the tile preview would be too small to see
+                size = self.tilemap.tile_size // self.zoom
+                pygame.draw.rect(self.display, (255, 255, 255), ((tile_pos[0] * self.tilemap.tile_size - render_scroll[0]) // self.zoom,
+                                                                 (tile_pos[1] * self.tilemap.tile_size - render_scroll[1]) // self.zoom, size, size), 1)
+            elif self.ongrid:
                 self.display.blit(current_tile_img, (tile_pos[0] * self.tilemap.tile_size - self.cam[0], tile_pos[1] * self.tilemap.tile_size - self.cam[1]))
             elif self.strg:
                 self.display.blit(current_tile_img, (tile_pos[0] * self.tilemap.tile_size - self.cam[0], tile_pos[1] * self.tilemap.tile_size - self.cam[1]))
             else:
                 self.display.blit(current_tile_img, mouse_position)
 
-            if self.clicking and self.ongrid:
-                self.tilemap.tilemap[str(tile_pos[0]) + ';' + str(tile_pos[1])] = {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': tile_pos}
-            if self.right_clicking:
-                tile_loc = str(tile_pos[0]) + ';' + str(tile_pos[1])
-                if tile_loc in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_loc]
-                for tile in self.tilemap.offgrid_tiles.copy():
-                    tile_img = self.assets[tile['type']][tile['variant']]
-                    tile_r = pygame.Rect(tile['pos'][0] - self.cam[0], tile['pos'][1] - self.cam[1], tile_img.get_width(), tile_img.get_height())
-                    if tile_r.collidepoint(mouse_position):
-                        self.tilemap.offgrid_tiles.remove(tile)
+            world_mouse = (mouse_position[0] + self.cam[0], mouse_position[1] + self.cam[1])
+            if self.selection is not None:
+                self.draw_rect(*self.selection, (255, 255, 0), render_scroll)
+            for tile in self.selected:
+                self.draw_outline(tile, (255, 255, 0), render_scroll)
+            hovered = self.picker.top(world_mouse) if not self.ongrid or self.alt else None
+            if hovered is not None:
+                self.draw_outline(hovered, (255, 255, 255), render_scroll)
+            if self.rect_start is not None:
+                self.draw_rect(self.rect_start, tile_pos, (255, 0, 0) if self.rect_button == 3 else (255, 255, 255), render_scroll)
+
+            if self.clicking and self.ongrid and self.rect_start is None:
+                current = self.tilemap.tilemap.get(str(tile_pos[0]) + ';' + str(tile_pos[1]))
+                if current is None or (current.type, current.variant) != (self.tile_list[self.tile_group], self.tile_variant):
+                    self.tilemap.set_tile(tile_pos, Tile(self.tile_list[self.tile_group], self.tile_variant, tile_pos))
+                    self.tilemap.autotile_cells([tile_pos])
+            if self.right_clicking and self.rect_start is None:
+                if self.tilemap.remove_tile(tile_pos):
+                    self.tilemap.autotile_cells([tile_pos])
+                self.remove_offgrids(self.picker.at(world_mouse))
 
 
             current_tile_img.set_alpha(255)
@@ -104,17 +242,27 @@ class Editor:
             # add event listeners
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.saver.close()      # finish pending saves
                     pygame.quit()
                     sys.exit()
 
                 # mouse clicks/wheel for placing tiles
                 if event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1:                   # place on left click
+                    if event.button in (1, 3) and self.shift:   # rectangle fill / erase with shift + drag
+                        self.rect_start = tile_pos
+                        self.rect_button = event.button
+                    if event.button == 2:                   # select region for copy with middle drag
+                        self.rect_start = tile_pos
+                        self.rect_button = 2
+                    if event.button == 1 and self.alt:      # toggle selection of the offgrid tile under the cursor with alt + click
+                        if hovered is not None:
+                            self.toggle_selected(hovered)
+                    elif event.button == 1:                 # place on left click
                         self.clicking = True
-                        if not self.ongrid and not self.strg:
-                            self.tilemap.offgrid_tiles.append({'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': (mouse_position[0] + self.cam[0], mouse_position[1] + self.cam[1])})
-                        elif not self.ongrid:
-                            self.tilemap.offgrid_tiles.append({'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': (tile_pos[0] * self.tilemap.tile_size, tile_pos[1] * self.tilemap.tile_size)})
+                        if self.rect_start is None and not self.ongrid and not self.strg:
+                            self.tilemap.add_offgrid(Tile(self.tile_list[self.tile_group], self.tile_variant, (mouse_position[0] + self.cam[0], mouse_position[1] + self.cam[1])))
+                        elif self.rect_start is None and not self.ongrid:
+                            self.tilemap.add_offgrid(Tile(self.tile_list[self.tile_group], self.tile_variant, (tile_pos[0] * self.tilemap.tile_size, tile_pos[1] * self.tilemap.tile_size)))
                             print((tile_pos[0] * self.tilemap.tile_size, tile_pos[1] * self.tilemap.tile_size))
                     if event.button == 3:                   # remove on right click
                         self.right_clicking = True
@@ -134,6 +282,17 @@ class Editor:
                             self.tile_group = (self.tile_group + 1) % len(self.tile_list)
 
                 if event.type == pygame.MOUSEBUTTONUP:
+                    if self.rect_start is not None and event.button == self.rect_button:
+                        if event.button == 1:
+                            self.fill_rect(self.rect_start, tile_pos)
+                        elif event.button == 3:
+                            self.erase_rect(self.rect_start, tile_pos)
+                        else:
+                            self.selection = (self.rect_start, tile_pos)
+                            for tile in self.offgrid_in_rect(*self.selection):
+                                if not any(selected is tile for selected in self.selected):
+                                    self.selected.append(tile)
+                        self.rect_start = None
                     if event.button == 1:
                         self.clicking = False
                     if event.button == 3:
@@ -151,8 +310,30 @@ class Editor:
                         self.movement[3] = True
                     if event.key == pygame.K_g:             # toggle on and off grid with g
                         self.ongrid = not self.ongrid
+                    if event.key == pygame.K_f:             # flood fill the region under the cursor with f
+                        self.flood_fill(tile_pos)
+                    if event.key == pygame.K_c and self.selection is not None:     # copy the selected region with c
+                        self.copy_region(*self.selection)
+                    if event.key == pygame.K_v:             # paste the copied region at the cursor with v
+                        self.paste(tile_pos)
+                    if event.key == pygame.K_DELETE:        # remove the selected offgrid tiles with delete
+                        self.remove_offgrids(self.selected)
+                    if event.key == pygame.K_ESCAPE:        # clear selection with escape
+                        self.selected = []
+                        self.selection = None
+                    if event.key == pygame.K_LALT:          # hold alt to pick offgrid tiles
+                        self.alt = True
+                    if event.key == pygame.K_z and self.strg:   # undo with ctrl + z, redo with ctrl + y
+                        self.history.undo()
+                    elif event.key == pygame.K_y and self.strg:
+                        self.history.redo()
+                    elif event.key == pygame.K_z:           # toggle zoomed out overview with z (keeps the view centered)
+                        width, height = self.display.get_size()
+                        center = (self.cam[0] + width * self.zoom / 2, self.cam[1] + height * self.zoom / 2)
+                        self.zoom = OVERVIEW_SCALE if self.zoom == 1 else 1
+                        self.cam = [center[0] - width * self.zoom / 2, center[1] - height * self.zoom / 2]
                     if event.key == pygame.K_o:             # press o for saving
-                        self.tilemap.save(f'map-big1.json')
+                        self.saver.save()
                     if event.key == pygame.K_t:             # automatically select correct variant with t
                         self.tilemap.autotile()
                     if event.key == pygame.K_b:             # press b to place tiles on border
@@ -180,6 +361,13 @@ class Editor:
                         self.shift = False
                     if event.key == pygame.K_LCTRL:
                         self.strg = False
+                    if event.key == pygame.K_LALT:
+                        self.alt = False
+
+            # the edits of a frame are one undo step, a drag stroke stays one step until the mouse is released
+            if not (self.clicking or self.right_clicking):
+                self.history.commit()
+            self.saver.autosave()
 
             # scale and project the screen to the full display
             self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))
@@ -1,40 +1,58 @@
-import math
+import argparse
+import os
+import random
 import sys
+import threading
 import time
-from data.game_text import game_text
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
 import pygame
 from scripts.entities import Player, Enemy, LightEntity, Npc, ShadowEyeGlowEntity
-from scripts.utils import load_image, load_transparent_images, render_proximity, totem_data
-from scripts.utils import load_images
-from scripts.utils import Animation, DialogueHandler, Codex
+from scripts.utils import render_totem_prompt, totem_data
+from scripts.utils import DialogueHandler, Codex
+from scripts.assets import AssetManager, spawner_groups
+from scripts.intro import Intro
 from scripts.tilemap import Tilemap
+from scripts.collision import Collider
+from scripts.navigation import FlowField
+from scripts.knn import KnnBoard
 from scripts.clouds import Clouds
+from scripts.replay import ReplayRecorder, ReplayPlayer
+from scripts.snapshot import WorldSnapshot
+from scripts.triggers import TriggerZones
+from scripts.objectives import EventBus, LEVEL_OBJECTIVES
+from scripts.captures import CaptureWriter
+from scripts.lens import Lens, render_mark
 
+LEVEL_MAPS = ['map-big1.json', 'map-big2.json', 'map-big3.json']    # map file of each level
 
-def calculate_distance(pos1, pos2):
-    return math.sqrt((pos1[0] - pos2[0])**2 + (pos1[1] - pos2[1])**2)
-
-
-def knn(k, target, group_one, group_two):
-    distances = []
-    for pos in group_one:
-        distances.append([calculate_distance(target, pos), 1])
-    for pos in group_two:
-        distances.append([calculate_distance(target, pos), 2])
-
-    distances = sorted(distances)[:k]
-    neighbor_count_group_one = [element[1] for element in distances].count(1)
-    if neighbor_count_group_one > k // 2:
-        assigned_group = 1
-    else:
-        assigned_group = 2
-    return assigned_group
+TICK_RATE = 60          # simulation ticks per second, independent of the frame rate
+TICK = 1 / TICK_RATE
+MAX_CATCH_UP = 5        # ticks simulated per rendered frame at most, a slower machine runs in slow motion instead of freezing
+RENDER_FPS = 144        # frame rate limit of the rendering (0: no limit)
+NPC_PROMPT_DISTANCE = 30    # pixels from an npc within which 'Press E' starts its dialogue
+TOTEM_PROMPT_DISTANCE = 40  # same for 'Press N' at a totem
 
 
 class Game:
-    def __init__(self):
+    # seed: seed of the rng used by the entity ai (random if None)
+    # headless: no window and no fps limit, used to play back replays at full speed
+    # record / replay: path of a replay file to write / to play back instead of reading the keyboard
+    def __init__(self, seed=None, headless=False, record=None, replay=None):
+        self.headless = headless
+        if headless:
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
         pygame.init()
 
+        self.replay = ReplayPlayer(replay) if replay else None
+        if self.replay and seed is None:
+            seed = self.replay.seed
+        elif seed is None:
+            seed = random.getrandbits(63)
+        self.seed = seed
+        self.rng = random.Random(seed)   # every random decision of the session goes through this stream
+
         # set display name and size
         pygame.display.set_caption('Supervised game')
         self.screen = pygame.display.set_mode((1280, 960))
@@ -44,72 +62,47 @@ class Game:
 
         # init game clock
         self.clock = pygame.time.Clock()
-        self.level = 0
+        self.level = self.replay.level if self.replay else 0
+        self.frame = 0      # number of ticks simulated since run was called (replays are indexed by it)
+        self.render_fps = RENDER_FPS
+        self.threaded = False       # simulate the next ticks on a worker thread while the previous snapshot is drawn
+        self.level_loads = 0        # snapshots taken before a level load are not drawn on the new map
+        self.world_lock = threading.Lock()  # held while the tilemap is loaded or drawn
+        self.pending_events = []    # input polled while rendering, handled at the start of the next tick
+        self.running = True
+        self.recorder = ReplayRecorder(record, self.seed, self.level) if record else None
+        self.capture_writer = None  # CaptureWriter the flash captures are saved with (not saved if None)
+        self.lens = None            # Lens marking the lights and shadows on screen with what it takes them for (off if None)
+        self.level_maps = list(LEVEL_MAPS)
+        self.extra_entities = {}    # spawner variant: number of additional entities placed on random grass tiles per level load
+
+        # session statistics (used by the batch runner)
+        self.profile = False    # collect frame times (rendered frames, one tick each when headless)
+        self.frame_times = []
+        self.deaths = 0
+        self.captures = 0
 
         self.movement = [False, False, False, False]
 
-        self.assets = {
-            'decor': load_images('tiles/decor'),
-            'grass': load_images('tiles/grass'),
-            'ground_decor': load_images('tiles/ground_decor'),
-            'stone': load_images('tiles/stone'),
-            'tree': load_images('tiles/tree'),
-            'water': load_images('tiles/water'),
-            'spawners': load_images('tiles/spawners'),
-
-            'background': load_image('background.png'),
-            'background2': load_image('background2.png'),
-            'background2_dimmed': load_image('background/start/05.png'),
-            "bg_dimmed": load_images("background/start"),
-
-            'player': load_image('entities/player.png'),
-            'player/idle/side': Animation(load_images('entities/player/idle/side'), img_dur=6),
-            'player/idle/front': Animation(load_images('entities/player/idle/front'), img_dur=6),
-            'player/idle/back': Animation(load_images('entities/player/idle/back'), img_dur=6),
-            'player/run/side': Animation(load_images('entities/player/run/side'), img_dur=5),
-            'player/run/front': Animation(load_images('entities/player/run/front'), img_dur=5),
-            'player/run/back': Animation(load_images('entities/player/run/back'), img_dur=5),
-            'player/slash/side': Animation(load_images('entities/player/slash/side'), img_dur=5),
-            'player/slash/front': Animation(load_images('entities/player/slash/front'), img_dur=5),
-            'player/slash/back': Animation(load_images('entities/player/slash/back'), img_dur=5),
-
-            'light/idle/side': Animation(load_transparent_images('entities/light/idle/side'), img_dur=6),
-            'light/idle/front': Animation(load_transparent_images('entities/light/idle/front'), img_dur=6),
-            'light/idle/back': Animation(load_transparent_images('entities/light/idle/back'), img_dur=6),
-            'light/walk/side': Animation(load_transparent_images('entities/light/walk/side'), img_dur=5),
-            'light/walk/front': Animation(load_transparent_images('entities/light/walk/front'), img_dur=5),
-            'light/walk/back': Animation(load_transparent_images('entities/light/walk/back'), img_dur=5),
-
-            'enemy/attack/side': Animation(load_images('entities/enemy/attack/side', background=(0, 255, 43)), img_dur=5),
-            'enemy/attack/front': Animation(load_images('entities/enemy/attack/front', background=(0, 255, 43)), img_dur=5),
-            'enemy/attack/back': Animation(load_images('entities/enemy/attack/back', background=(0, 255, 43)), img_dur=5),
-            'enemy/death': Animation(load_images('entities/enemy/death', background=(0, 255, 43)), img_dur=5),
-            'enemy/idle/side': Animation(load_images('entities/enemy/idle/side', background=(0, 255, 43)), img_dur=6),
-            'enemy/idle/front': Animation(load_images('entities/enemy/idle/front', background=(0, 255, 43)), img_dur=6),
-            'enemy/idle/back': Animation(load_images('entities/enemy/idle/back', background=(0, 255, 43)), img_dur=6),
-            'enemy/walk/side': Animation(load_images('entities/enemy/walk/side', background=(0, 255, 43)), img_dur=5),
-            'enemy/walk/front': Animation(load_images('entities/enemy/walk/front', background=(0, 255, 43)), img_dur=5),
-            'enemy/walk/back': Animation(load_images('entities/enemy/walk/back', background=(0, 255, 43)), img_dur=5),
-
-            'npc/idle/side': Animation(load_images('entities/npc/idle/side', background=(0, 255, 43)), img_dur=24),
-
-            'shadow-eye-glow/idle/side': Animation(load_transparent_images('entities/shadow-eye-glow/idle/side'), img_dur=6),
-            'shadow-eye-glow/idle/front': Animation(load_transparent_images('entities/shadow-eye-glow/idle/front'), img_dur=6),
-            'shadow-eye-glow/idle/back': Animation(load_transparent_images('entities/shadow-eye-glow/idle/back'), img_dur=6),
-            'shadow-eye-glow/walk/side': Animation(load_transparent_images('entities/shadow-eye-glow/walk/side'), img_dur=5),
-            'shadow-eye-glow/walk/front': Animation(load_transparent_images('entities/shadow-eye-glow/walk/front'), img_dur=5),
-            'shadow-eye-glow/walk/back': Animation(load_transparent_images('entities/shadow-eye-glow/walk/back'), img_dur=5),
-
-        }
+        self.assets = AssetManager()     # level specific sprites are loaded by load_level
 
         # create player
         self.player = Player(self, (50, 50), (8, 17))
 
         # create tilemap
         self.tilemap = Tilemap(self)
+        self.collider = Collider(self.tilemap)
         self.totems = []
         self.totemid = -1
-        self.solved_totems = 0
+        self.knn_board = None       # KnnBoard of the lanterns the knn totems ask about (level 3)
+        self.knn_target = None
+
+        # the objective of the level counts the events of the simulation and tells when the next level is due
+        self.events = EventBus()
+        self.events.subscribe('objective_complete', self.on_objective_complete)
+        self.objective = None
+        self.objective_level = None
+        self.level_complete = False
 
         # initialize lists used in load_level
         self.dialogue_handler = DialogueHandler(pygame.font.SysFont('Arial', 20))
@@ -123,6 +116,12 @@ class Game:
         # list of rects npcs
         self.npc_rects = []
 
+        # zones around the npcs and totems, the player entering or leaving one shows or hides its prompt
+        self.triggers = TriggerZones()
+        self.triggers.listeners.append(self.on_trigger)
+        self.near_npcs = []
+        self.near_totems = []
+
         # variables for flash
         self.flash = False
         self.pictures_taken = 0
@@ -130,8 +129,10 @@ class Game:
         # list to store render elements
         self.render_list = []
 
-        # camera position
+        # camera position (at the current and the previous tick, rendering interpolates in between)
         self.cam = [0, 0]
+        self.prev_cam = [0, 0]
+        self.render_cam = (0, 0)
 
         # dead timer
         self.dead_timer = 0
@@ -139,397 +140,482 @@ class Game:
         # Render the text
         self.font = pygame.font.SysFont('Arial', 25)
         self.codex = Codex(self.font, self.dialogue_display)
-        self.display_text = game_text["intro"]
-        self.active_text = 0
-        self.messages = self.display_text[self.active_text]
-        self.snip = self.font.render('', True, (255, 255, 255))
-        self.text_counter = 0
-        self.text_speed = 3
-        self.active_message = 0
-        self.message = self.messages[self.active_message]
-        self.text_done = False
-
-    def load_level(self):
-        # reset lists and vars
-        self.enemies = []
-        self.light_entities = []
-        self.shadow_eye_glow = []
-        self.npcs = []
-        self.nr_enemies = 0
-        self.nr_light_and_shadow = 0
-        self.npc_rects = []
-        self.pictures_taken = 0
-
-        if self.level == 0:
-            self.tilemap.load(f'map-big1.json')
-        elif self.level == 1:
-            self.tilemap.load(f'map-big2.json')
-        elif self.level == 2:
-            self.tilemap.load(f'map-big3.json')
-
-        #self.tilemap.load('map-debug.json')
-
-        # create player, enemies, npcs and light entities from spawners (and cont of enemies)
-        for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1), ('spawners', 2), ('spawners', 3), ('spawners', 4), ]):
-            if spawner['variant'] == 0:
-                self.player.pos = spawner['pos']
-            elif spawner['variant'] == 1:
-                self.light_entities.append(LightEntity(self, spawner['pos'], (8, 15)))
-            elif spawner['variant'] == 2:
-                self.npcs.append(Npc(self, spawner['pos'], (18, 12)))
-            elif spawner['variant'] == 3:
-                self.enemies.append(Enemy(self, spawner['pos'], (16, 35)))
-            elif spawner['variant'] == 4:
-                self.shadow_eye_glow.append(ShadowEyeGlowEntity(self, spawner['pos'], (8, 15)))
-            else:  # not accessed for now
-                self.enemies.append(Enemy(self, spawner['pos'], (8, 15)))  # might have to change size
-        self.nr_enemies = len(self.enemies)
-        self.nr_light_and_shadow = len(self.light_entities) + len(self.shadow_eye_glow)
-
-        # list of rects npcs
-        self.npc_rects = [r.rect() for r in self.npcs]
-
-        # variables for flash
-        self.flash = False
-        self.pictures_taken = 0
-
-        # list to store render elements
-        self.render_list = []
 
-        # camera position
-        self.cam = [0, 0]
+    # fixed timestep loop: the simulation advances in ticks of TICK seconds, every rendered frame interpolates between the last two
+    # headless runs simulate exactly one tick per frame, so replays and batch runs do not depend on the wall clock
+    def run(self, max_frames=None):
+        if self.headless:
+            self.load_level()
+        else:
+            self.intro()    # loads the first level meanwhile
+
+        pipeline = ThreadPoolExecutor(max_workers=1) if self.threaded else None
+        snapshot, snapshot_alpha = WorldSnapshot(self), 1.0
+        accumulator = 0.0
+        last_time = time.perf_counter()
+        while self.running and (max_frames is None or self.frame < max_frames):
+            frame_start = time.perf_counter()
+            if self.headless:
+                ticks = 1
+            else:
+                accumulator += frame_start - last_time
+                ticks = min(int(accumulator / TICK), MAX_CATCH_UP)
+                accumulator = min(accumulator - ticks * TICK, TICK)    # time that could not be caught up is dropped
+            last_time = frame_start
+            alpha = 1.0 if self.headless else accumulator / TICK
 
-        # dead timer
-        self.dead_timer = 0
-
-    def run(self):
-        self.load_level()
-        self.screen.blit(self.assets["background2"], (0, 0))
+            # add event listeners
+            if self.replay:
+                pygame.event.pump()
+            else:
+                self.pending_events.extend(pygame.event.get())
+
+            if pipeline:
+                # two stage pipeline: the worker simulates the ticks of this frame while the snapshot of the last frame is drawn
+                # and scaled (SDL releases the GIL for the pixel work), the world is shown one frame later than serially
+                # (the dialogue box and the codex are drawn by render from the live state once the worker is done)
+                future = pipeline.submit(self.simulate, ticks, max_frames)
+                self.draw(snapshot, snapshot_alpha)
+                self.scale_display()
+                snapshot, snapshot_alpha = future.result(), alpha
+            else:
+                snapshot = self.simulate(ticks, max_frames)
+                self.draw(snapshot, alpha)
+                self.scale_display()
+            self.render()
+            if self.profile:
+                self.frame_times.append(time.perf_counter() - frame_start)
+
+            if not self.headless and self.render_fps:
+                self.clock.tick(self.render_fps)
+
+        if pipeline:
+            pipeline.shutdown()
+        self.assets.close()
+        if self.recorder:
+            self.recorder.close()
+        if self.capture_writer:
+            self.capture_writer.close()
+        if self.lens:
+            self.lens.close()
+
+    # run up to ticks simulation ticks and take the snapshot drawn for them
+    def simulate(self, ticks, max_frames=None):
+        for _ in range(ticks):
+            if not self.running or (max_frames is not None and self.frame >= max_frames):
+                break
+            self.tick()
+        if self.lens:
+            view = pygame.Rect(self.cam, self.display.get_size())
+            self.lens.update([entity for entity in self.light_entities + self.shadow_eye_glow if entity.rect().colliderect(view)])
+        return WorldSnapshot(self)
+
+    # input of the tick (recorded or played back), then one simulation step
+    def tick(self):
+        if self.replay:
+            if self.replay.done(self.frame):
+                self.running = False
+                return
+            events = self.replay.get(self.frame)
+        else:
+            events = self.pending_events
+            self.pending_events = []
+            if self.recorder:
+                self.recorder.record(self.frame, events)
+        for event in events:
+            self.handle_event(event)
+
+        self.step()
+        self.frame += 1
 
-        # Update the display
+    def load_level(self):
+        # the renderer may still draw the last snapshot of the old map on another thread
+        with self.world_lock:
+            # reset lists and vars
+            self.enemies = []
+            self.light_entities = []
+            self.shadow_eye_glow = []
+            self.npcs = []
+            self.nr_enemies = 0
+            self.nr_light_and_shadow = 0
+            self.npc_rects = []
+            self.pictures_taken = 0
+
+            self.tilemap.load(self.level_maps[self.level])
+
+            #self.tilemap.load('map-debug.json')
+
+            # create player, enemies, npcs and light entities from spawners (and cont of enemies)
+            spawners = self.tilemap.extract([('spawners', 0), ('spawners', 1), ('spawners', 2), ('spawners', 3), ('spawners', 4), ])
+            self.assets.use_level(spawner_groups({spawner.variant for spawner in spawners} | set(self.extra_entities)))
+            if self.lens:
+                self.lens.clear()
+            for spawner in spawners:
+                self.spawn(spawner.variant, spawner.pos)
+
+            # additional entities for stress tests
+            if self.extra_entities:
+                grass_tiles = [tile for tile in self.tilemap.tilemap.values() if tile.type == 'grass']
+                for variant, count in self.extra_entities.items():
+                    for _ in range(count if grass_tiles else 0):
+                        tile = self.rng.choice(grass_tiles)
+                        self.spawn(variant, [tile.pos[0] * self.tilemap.tile_size, tile.pos[1] * self.tilemap.tile_size])
+            self.nr_enemies = len(self.enemies)
+            self.nr_light_and_shadow = len(self.light_entities) + len(self.shadow_eye_glow)
+
+            # list of rects npcs
+            self.npc_rects = [r.rect() for r in self.npcs]
+
+            # enemies path find towards the player
+            self.flow_field = FlowField(self.tilemap)
+
+            # totems and knn lantern board (levels 2 and 3), collected once per level load
+            self.totems = self.tilemap.get_totems(self.level) if self.level in (1, 2) else []
+            if self.level == 2:
+                self.knn_board, self.knn_target = KnnBoard.from_tiles(self.tilemap.get_knn())
+            else:
+                self.knn_board, self.knn_target = None, None
+
+            # a reload after a death restarts the objective (it decides what is kept)
+            self.level_complete = False
+            if self.objective is not None and self.objective_level == self.level:
+                self.objective.restart(self)
+            else:
+                if self.objective is not None:
+                    self.objective.close()
+                objective = LEVEL_OBJECTIVES.get(self.level)
+                self.objective = objective(self.events, self) if objective else None
+                self.objective_level = self.level
+
+            self.triggers.clear()
+            self.near_npcs = []
+            self.near_totems = []
+            for npc in self.npcs:   # npcs don't move
+                self.triggers.add(npc, 'npc', npc.pos, NPC_PROMPT_DISTANCE)
+            for totem in self.totems:
+                self.triggers.add(totem, 'totem', totem.pos, TOTEM_PROMPT_DISTANCE)
+
+            # variables for flash
+            self.flash = False
+            self.pictures_taken = 0
+
+            # list to store render elements
+            self.render_list = []
+
+            # camera position
+            self.cam = [0, 0]
+            self.prev_cam = [0, 0]
+
+            # dead timer
+            self.dead_timer = 0
+            self.level_loads += 1
+
+            # sprites of the next level are loaded while this one is played
+            if self.level + 1 < len(self.level_maps):
+                self.assets.prefetch_level(self.level_maps[self.level + 1], self.extra_entities)
+
+    # entities placed overlapping physics rects are moved to the closest free spot first, their first move would push them out
+    def spawn(self, variant, pos):
+        if variant == 0:
+            self.player.teleport(self.collider.free_position(pos, self.player.size))
+        elif variant == 1:
+            self.light_entities.append(LightEntity(self, self.collider.free_position(pos, (8, 15)), (8, 15)))
+        elif variant == 2:
+            self.npcs.append(Npc(self, self.collider.free_position(pos, (18, 12)), (18, 12)))
+        elif variant == 3:
+            self.enemies.append(Enemy(self, self.collider.free_position(pos, (16, 35)), (16, 35)))
+        elif variant == 4:
+            self.shadow_eye_glow.append(ShadowEyeGlowEntity(self, self.collider.free_position(pos, (8, 15)), (8, 15)))
+        else:  # not accessed for now
+            self.enemies.append(Enemy(self, self.collider.free_position(pos, (8, 15)), (8, 15)))  # might have to change size
+
+    # splash screen and typewriter intro, skipped when running headless
+    # shown right away and kept responsive, the images of the fade and the first level are loaded on a worker thread meanwhile
+    def intro(self):
+        self.assets.acquire('splash')
+        loader = ThreadPoolExecutor(max_workers=1)
+        intro_ready = loader.submit(self.assets.acquire, 'intro')
+        level_ready = loader.submit(self.load_level)
+        intro = Intro(self, intro_ready, level_ready)
         pygame.display.flip()
-        timer = pygame.time.Clock()
 
-        time.sleep(1)
-
-        for image in self.assets["bg_dimmed"]:
-            self.screen.blit(image, (0, 0))
-            pygame.display.flip()
-            time.sleep(0.2)
-
-        # Blit the image and text
-        self.screen.blit(self.assets["background2_dimmed"], (0, 0))
-        pygame.display.flip()
-        # Wait for an event (like a key press) to continue
-        line_counter = 0
-        line_done = False
-        waiting = True
-        while waiting:
-            timer.tick(60)
-
-            text_len = sum(map(len, self.messages))
-            if self.text_counter < self.text_speed * text_len:
-                self.text_counter += 1
-            elif self.text_counter >= self.text_speed*text_len:
-                self.text_done = True
-
-            if line_counter < self.text_speed * len(self.message):
-                line_counter += 1
-            elif line_counter >= self.text_speed*len(self.message) and not self.text_done:
-                line_counter = 0
-                self.active_message += 1
-                self.message = self.messages[self.active_message]
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    waiting = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_s:
-                        waiting = False
-                    elif self.text_done and self.active_text < len(self.display_text)-1:
-                        self.screen.blit(self.assets["background2_dimmed"], (0, 0))
-                        self.active_text += 1
-                        self.active_message = 0
-                        self.text_done = False
-                        self.messages = self.display_text[self.active_text]
-                        self.message = self.messages[self.active_message]
-                        self.text_counter = 0
-                        line_counter = 0
-                    elif self.active_text == len(self.display_text)-1:
-                        waiting = False
-
-            full_text_surface = self.font.render(self.message, True, 'white')
-            full_text_rect = full_text_surface.get_rect(center=(1280 // 2, 960 // 2))
-
-            snip = self.font.render(self.message[0:line_counter // self.text_speed], True, 'white')
-            snip_rect = snip.get_rect(center=(1280 // 2, 960 // 2 + self.active_message * 50))
-
-            # Adjust snip_rect to match the full text position
-            snip_rect.left = full_text_rect.left
-            self.screen.blit(snip, snip_rect)
+        timer = pygame.time.Clock()
+        while not intro.done:
+            dt = timer.tick(60) / 1000
+            intro.update(dt, pygame.event.get())
             pygame.display.flip()
 
-        while True:
-            if not self.dialogue_handler.dialogue_active and not self.codex.codex_active:
-                self.display.blit(self.assets['background'], (0, 0))    # reset screen
-                self.dialogue_display.fill((0,0,0,0))
-
-                # delay reload after death
-                if self.dead_timer:
-                    self.dead_timer += 1
-                    if self.dead_timer > 40:
-                        self.load_level()
-
-
-                # transition to next level
-                if self.level == 0:
-                    if self.nr_light_and_shadow != 0 and self.pictures_taken == self.nr_light_and_shadow:
-                        self.level += 1
-                        self.load_level()
-
-
-                # horizontal cam movement (player center - half of screen width (for centering player) - current cam position)
-                self.cam[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.cam[0]) / 10
-                # vertical cam movement (player center - half of screen width (for centering player) - current cam position)
-                self.cam[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.cam[1]) / 10
-                self.render_cam = (int(self.cam[0]), int(self.cam[1]))
-
-                if self.dead_timer == 0:    # don't update player when dead
-                    self.player.update(self.tilemap, (self.movement[1] - self.movement[0], self.movement[2] - self.movement[3]))
-
-                # render order: tiles behind player, enemies, player, flash, tiles in front of player
-                self.tilemap.render_back(self.display, offset=self.render_cam, player_pos=self.player.pos)
-
-                # list of objects to render
-                self.render_list = self.tilemap.render_order_offgrid(self.display, offset=self.render_cam)
-
-                if self.dead_timer == 0:    # don't render player when dead
-                    self.render_list.append(self.player.render_order(offset=self.render_cam))
-
-                # remove enemies when attacking them
-                if 0 < self.player.attack_cd < 30:
-                    attack_pos = self.player.attack_pos(offset=self.render_cam)
-                    attack_rect = self.player.attack_rect(attack_pos)
-                    for enemy in self.enemies:
-                        #pygame.draw.rect(self.display, (255, 255, 0), enemy.rect_offset(offset=self.render_cam),1)  # debug purpose only, delete later !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-                        if enemy.rect_offset(offset=self.render_cam).colliderect(attack_rect):
-                            self.enemies.remove(enemy)
-
-                for enemy in self.enemies.copy():
-                    if enemy.rect_offset(offset=self.render_cam).colliderect(self.player.rect_offset(offset=self.render_cam)):
-                        self.dead_timer += 1
-                    enemy.update(self.tilemap, (0, 0))
-                    self.render_list.append(enemy.render_order(offset=self.render_cam))
-
-                for light_entity in self.light_entities.copy():
-                    light_entity.update(self.tilemap, (0, 0))
-                    self.render_list.append(light_entity.render_order(offset=self.render_cam))
-
-                for shadow_entity in self.shadow_eye_glow.copy():
-                    shadow_entity.update(self.tilemap, (0, 0))
-                    self.render_list.append(shadow_entity.render_order(offset=self.render_cam))
-
-                for npc in self.npcs.copy():
-                    npc.update(self.tilemap, (0, 0))
-                    self.render_list.append(npc.render_order(offset=self.render_cam))
-                    npc.render_proximity_text(self.player.pos, self.display, self.render_cam)
-
-
-                # taking pictures and removing light and shadow entities
-                if self.flash:
-                    flash_pos = self.player.flash_pos(offset=self.render_cam)
-                    flash_rect = self.player.flash_rect(flash_pos)
-                    self.render_list.append(self.player.render_order_flash(offset=self.render_cam))
-                    for light_entity in self.light_entities:
-                        if light_entity.rect_offset(offset=self.render_cam).colliderect(flash_rect):
-                            self.pictures_taken += 1
-                            self.light_entities.remove(light_entity)
-                    for shadow_entity in self.shadow_eye_glow:
-                        #pygame.draw.rect(self.display, (255, 255, 0), shadow_entity.rect_offset(offset=self.render_cam),1)  # debug purpose only, delete later !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-                        if shadow_entity.rect_offset(offset=self.render_cam).colliderect(flash_rect):
-                            self.pictures_taken += 1
-                            self.shadow_eye_glow.remove(shadow_entity)
-
-
-                # sort render list by y position
-                self.render_list.sort(key=lambda x: x['pos_adj'][1])
-
-                # render objects in render list
-                for render_object in self.render_list:
-                    if render_object['type'] == 'player':
-                        self.player.render(self.display, offset=self.render_cam)
-
-                    elif render_object['type'] == 'enemy':
-                        for enemy in self.enemies:
-                            if enemy.pos == list(render_object['pos']):
-                                enemy.render(self.display, offset=self.render_cam)
-
-                    elif render_object['type'] == 'light_entity':
-                        for light_entity in self.light_entities:
-                            if light_entity.pos == list(render_object['pos']):
-                                light_entity.render(self.display, offset=self.render_cam)
-
-                    elif render_object['type'] == 'shadow_entity':
-                        for shadow_entity in self.shadow_eye_glow:
-                            if shadow_entity.pos == list(render_object['pos']):
-                                shadow_entity.render(self.display, offset=self.render_cam)
-
-                    elif render_object['type'] == 'npc':
-                        for npc in self.npcs:
-                            if npc.pos == list(render_object['pos']):
-                                npc.render(self.display, offset=self.render_cam)
-
-                    elif render_object['type'] == 'flash':
-                        self.player.render_flash(self.assets['grass'][37], flash_pos, self.display)
-
+        loader.shutdown()
+        self.assets.release('intro')    # only shown once
+        self.assets.release('splash')
+
+    # advance the simulation by one tick (1 / TICK_RATE seconds), speeds, cooldowns and animations count ticks
+    def step(self):
+        if self.dialogue_handler.dialogue_active or self.codex.codex_active:
+            return
+
+        for entity in self.entities():
+            entity.begin_tick()
+        self.prev_cam = list(self.cam)
+
+        # delay reload after death
+        if self.dead_timer:
+            self.dead_timer += 1
+            if self.dead_timer > 40:
+                self.deaths += 1
+                self.load_level()
+
+        # horizontal cam movement (player center - half of screen width (for centering player) - current cam position)
+        self.cam[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.cam[0]) / 10
+        # vertical cam movement (player center - half of screen width (for centering player) - current cam position)
+        self.cam[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.cam[1]) / 10
+        cam = (int(self.cam[0]), int(self.cam[1]))     # the hit checks below compare rects relative to the camera
+
+        if self.dead_timer == 0:    # don't update player when dead
+            self.player.update(self.tilemap, (self.movement[1] - self.movement[0], self.movement[2] - self.movement[3]))
+
+        # remove enemies when attacking them
+        if 0 < self.player.attack_cd < 30:
+            attack_pos = self.player.attack_pos(offset=cam)
+            attack_rect = self.player.attack_rect(attack_pos)
+            for enemy in self.enemies:
+                if enemy.rect_offset(offset=cam).colliderect(attack_rect):
+                    self.enemies.remove(enemy)
+                    self.events.emit('kill', enemy)
+
+        if self.enemies:
+            self.flow_field.update(self.player.rect().center)
+        for enemy in self.enemies:
+            if enemy.rect_offset(offset=cam).colliderect(self.player.rect_offset(offset=cam)):
+                self.dead_timer += 1
+
+        self.update_entities(self.enemies + self.light_entities + self.shadow_eye_glow + self.npcs)
+
+
+        # taking pictures and removing light and shadow entities
+        if self.flash:
+            flash_rect = self.player.flash_rect(self.player.flash_pos(offset=cam))
+            for light_entity in self.light_entities:
+                if light_entity.rect_offset(offset=cam).colliderect(flash_rect):
+                    self.capture(light_entity, 'light')
+                    self.light_entities.remove(light_entity)
+            for shadow_entity in self.shadow_eye_glow:
+                if shadow_entity.rect_offset(offset=cam).colliderect(flash_rect):
+                    self.capture(shadow_entity, 'shadow')
+                    self.shadow_eye_glow.remove(shadow_entity)
+
+        # transition to the next level once the objective of this one is complete
+        if self.level_complete:
+            self.level += 1
+            self.load_level()
+
+        # prompts of the npcs and totems the player is close to
+        self.triggers.update(self.player.pos)
+
+    # the flash hit entity (label: light / shadow)
+    def capture(self, entity, label):
+        self.pictures_taken += 1
+        self.captures += 1
+        if self.capture_writer:
+            self.capture_writer.capture(entity, label, self.level, self.frame)
+        self.events.emit('capture', entity, label)
+
+    def on_objective_complete(self, objective):
+        self.level_complete = True
+
+    # listener of the trigger zones, the prompts and the E / N keys follow the zones the player is in
+    def on_trigger(self, event, zone):
+        near = self.near_npcs if zone.kind == 'npc' else self.near_totems
+        if event == 'enter':
+            near.append(zone.owner)
+        else:
+            near.remove(zone.owner)
+
+    # update of the ai entities: every entity plans its move, then the collisions of all of them are resolved in one batch
+    # (they don't collide with each other, so the result is the same as updating them one by one)
+    def update_entities(self, entities):
+        movements = [entity.plan(self.tilemap, (0, 0)) for entity in entities]
+        self.collider.move_many(entities, [entity.frame_movement(movement) for entity, movement in zip(entities, movements)])
+        for entity, movement in zip(entities, movements):
+            entity.after_move(movement)
+
+    def entities(self):
+        return [self.player] + self.enemies + self.light_entities + self.shadow_eye_glow + self.npcs
+
+    # draw a snapshot alpha (0 - 1) of the way from the previous to its tick, so motion stays smooth at any frame rate
+    # only reads the snapshot and the tilemap, so it can run while the simulation thread advances the live state
+    def draw(self, snapshot, alpha=1.0):
+        if snapshot.paused:
+            return
+
+        with self.world_lock:
+            if snapshot.level_loads != self.level_loads:
+                return  # the map changed since the snapshot, keep the last frame
+
+            self.display.blit(self.assets['background'], (0, 0))    # reset screen
+            self.dialogue_display.fill((0,0,0,0))
+
+            self.render_cam = snapshot.render_cam(alpha)
+            player_offset = snapshot.player.lerp_offset(self.render_cam, alpha)
+
+            # render order: tiles behind player, enemies, player, flash, tiles in front of player
+            self.tilemap.render_back(self.display, offset=self.render_cam, player_pos=snapshot.player.pos)
+
+            # list of objects to render, sorted by y position
+            self.render_list = self.tilemap.render_order_offgrid() + snapshot.entries
+            self.render_list.sort(key=attrgetter('depth'))
+
+        for pos in snapshot.npc_prompts:
+            Npc.render_prompt(pos, self.display, self.render_cam)
+
+        # render objects in render list
+        for render_object in self.render_list:
+            if render_object.entity is not None:
+                render_object.entity.render(self.display, offset=render_object.entity.lerp_offset(self.render_cam, alpha))
+
+            elif render_object.type == 'flash':
+                flash_pos = Player.flash_pos(snapshot.player, offset=player_offset)
+                self.player.render_flash(self.assets['grass'][37], flash_pos, self.display)
+
+            else:
+                self.tilemap.render_object(self.display, render_object.type, render_object.variant, render_object.pos, offset=self.render_cam)
+
+        for view, label in snapshot.lens_marks:
+            render_mark(self.display, view, label, view.lerp_offset(self.render_cam, alpha))
+
+        # render progress bar last (overlay)
+        if snapshot.progress is not None:
+            self.tilemap.render_progress_bar(self.display, progress=snapshot.progress)
+
+        for pos in snapshot.npc_prompts:
+            Npc.render_prompt(pos, self.dialogue_display, self.render_cam)
+
+        for pos in snapshot.totem_prompts:
+            render_totem_prompt(pos, self.dialogue_display, self.render_cam)
+
+    def handle_event(self, event):
+        if event.type == pygame.QUIT:
+            self.running = False
+
+        # key press
+        if self.dialogue_handler.dialogue_active:
+            self.movement = [0, 0, 0, 0]
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_RETURN and self.dialogue_handler.dialogue_active:
+                    self.dialogue_handler.next_line()
+                if (event.key == pygame.K_1 or event.key == pygame.K_2 or event.key == pygame.K_3) and len(self.dialogue_handler.choices)>0:
+                # Pass the player's choice to the dialogue handler
+                    if event.key == pygame.K_1:
+                        choice = '1'
+                    elif event.key == pygame.K_2:
+                        choice = '2'
                     else:
-                        self.tilemap.render_object(self.display, render_object['type'], render_object['variant'], render_object['pos'], offset=self.render_cam)
-
-                # render progress bar last (overlay)
-                if self.level == 0:
-                    try:
-                        self.tilemap.render_progress_bar(self.display, progress=self.pictures_taken/self.nr_light_and_shadow)
-                    except ZeroDivisionError:
-                        self.tilemap.render_progress_bar(self.display, progress=0)
-
-                for npc in self.npcs:
-                    npc.render_proximity_text(self.player.pos, self.dialogue_display, self.render_cam)
-
-                #self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0))
-                #self.player.update(self.tilemap, (self.movement[1] - self.movement[0], self.movement[2] - self.movement[3]))
-
-                # knn distances (only for level 3)
-                if self.level == 2:
-                    knn_group_one_pos = []
-                    knn_group_two_pos = []
-                    for tile in self.tilemap.get_knn():
-                        if tile['variant'] == 4:
-                            target_pos = tile['pos']
-                        elif tile['variant'] == 2:
-                            knn_group_one_pos.append(tile['pos'])
-                        else:
-                            knn_group_two_pos.append(tile['pos'])
-
-                if self.level == 1 or self.level == 2:
-                    self.totems = self.tilemap.get_totems(self.level)
-                    for tile in self.totems:
-                        render_proximity(tile, self.player.pos, self.dialogue_display, self.render_cam)
-
-                if self.level == 1:
-                    if self.solved_totems == len(self.totems):
-                        self.level += 1
-                        self.solved_totems = 0
-                        self.totems = []
-                        self.load_level()
-
-
-            # add event listeners
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-
-                # key press
-                if self.dialogue_handler.dialogue_active:
+                        choice = '3'
+                    #choice = '1' if event.key == pygame.K_1 else '2'
+                    made_choice = self.dialogue_handler.handle_choice(choice, self.totemid)
+                    if made_choice:
+                        self.events.emit('totem_solved', self.totemid)
+        elif self.codex.codex_active:
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_a:
+                     self.codex.turn_page("backward")
+                if event.key == pygame.K_d:
+                     self.codex.turn_page("forward")
+                if event.key == pygame.K_k:
+                    self.codex.toggle_codex()
                     self.movement = [0, 0, 0, 0]
-                    if event.type == pygame.KEYDOWN:
-                        if event.key == pygame.K_RETURN and self.dialogue_handler.dialogue_active:
-                            self.dialogue_handler.next_line()
-                        if (event.key == pygame.K_1 or event.key == pygame.K_2 or event.key == pygame.K_3) and len(self.dialogue_handler.choices)>0:
-                        # Pass the player's choice to the dialogue handler
-                            if event.key == pygame.K_1:
-                                choice = '1'
-                            elif event.key == pygame.K_2:
-                                choice = '2'
-                            else:
-                                choice = '3'
-                            #choice = '1' if event.key == pygame.K_1 else '2'
-                            made_choice = self.dialogue_handler.handle_choice(choice, self.totemid)
-                            if made_choice:
-                                self.solved_totems += 1
-                elif self.codex.codex_active:
-                    if event.type == pygame.KEYDOWN:
-                        if event.key == pygame.K_a:
-                             self.codex.turn_page("backward")
-                        if event.key == pygame.K_d:
-                             self.codex.turn_page("forward")
-                        if event.key == pygame.K_k:
-                            self.codex.toggle_codex()
-                            self.movement = [0, 0, 0, 0]
-
-
-                else:
-
-                    if event.type == pygame.KEYDOWN:
-                        if not len(self.npcs) == 0:
-                            if event.key == pygame.K_e and npc.dialogue:  # Assuming your NPC class has this method
-                                self.dialogue_handler.start_dialogue(self.level)
-                        if not len(self.totems) == 0:
-                            for totem in self.totems:
-                                if totem["dialogue"] is True and event.key == pygame.K_n:
-                                    self.dialogue_handler.start_totem_dialogue(totem["index"])
-                                    self.totemid = totem["index"]
-
-                        if event.key == pygame.K_LEFT:
-                            self.movement[0] = True
-                        if event.key == pygame.K_RIGHT:
-                            self.movement[1] = True
-                        if event.key == pygame.K_a:
-                            self.movement[0] = True
-                        if event.key == pygame.K_d:
-                            self.movement[1] = True
-                        if event.key == pygame.K_s:
-                            self.movement[2] = True
-                        if event.key == pygame.K_w:
-                            self.movement[3] = True
-                        if event.key == pygame.K_k:
-                            self.codex.toggle_codex()
-                        if event.key == pygame.K_SPACE:
-                            self.flash = True
-
-
-                    # key release
-                    if event.type == pygame.KEYUP:
-                        if event.key == pygame.K_LEFT:
-                            self.movement[0] = False
-                        if event.key == pygame.K_RIGHT:
-                            self.movement[1] = False
-                        if event.key == pygame.K_a:
-                            self.movement[0] = False
-                        if event.key == pygame.K_d:
-                            self.movement[1] = False
-                        if event.key == pygame.K_s:
-                            self.movement[2] = False
-                        if event.key == pygame.K_w:
-                            self.movement[3] = False
-                        if event.key == pygame.K_SPACE:
-                            self.flash = False
-
-                    # mouse click
-                    if event.type == pygame.MOUSEBUTTONDOWN:
-                        if event.button == 1:
-                            self.player.attack()
-
-            self.codex.render_book_icon()
-
-            # Render the codex if active
-            if self.codex.codex_active:
-                self.codex.render_codex()
-            # scale and project the screen to the full display
-            self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))
-            if self.dialogue_handler.dialogue_active:
-                self.dialogue_handler.render_dialogue_box(self.dialogue_display)
-
-                # Blit the dialogue_surface onto the game_screen
-                # Since game_screen has been transformed, we blit the dialogue_surface over it without any transformation
-            self.screen.blit(self.dialogue_display, (0, 0))
-            pygame.display.update()
-
-            # keep fps at 60
-            self.clock.tick(60)
-
-
-Game().run()
-
 
 
+        else:
+
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_e and self.near_npcs:
+                    self.dialogue_handler.start_dialogue(self.level)
+                if event.key == pygame.K_n:
+                    for totem in self.near_totems:
+                        self.dialogue_handler.start_totem_dialogue(totem.index, self.knn_board, self.knn_target)
+                        self.totemid = totem.index
+
+                if event.key == pygame.K_LEFT:
+                    self.movement[0] = True
+                if event.key == pygame.K_RIGHT:
+                    self.movement[1] = True
+                if event.key == pygame.K_a:
+                    self.movement[0] = True
+                if event.key == pygame.K_d:
+                    self.movement[1] = True
+                if event.key == pygame.K_s:
+                    self.movement[2] = True
+                if event.key == pygame.K_w:
+                    self.movement[3] = True
+                if event.key == pygame.K_k:
+                    self.codex.toggle_codex()
+                if event.key == pygame.K_SPACE:
+                    self.flash = True
+
+
+            # key release
+            if event.type == pygame.KEYUP:
+                if event.key == pygame.K_LEFT:
+                    self.movement[0] = False
+                if event.key == pygame.K_RIGHT:
+                    self.movement[1] = False
+                if event.key == pygame.K_a:
+                    self.movement[0] = False
+                if event.key == pygame.K_d:
+                    self.movement[1] = False
+                if event.key == pygame.K_s:
+                    self.movement[2] = False
+                if event.key == pygame.K_w:
+                    self.movement[3] = False
+                if event.key == pygame.K_SPACE:
+                    self.flash = False
+
+            # mouse click
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:
+                    self.player.attack()
+
+    # scale and project the screen to the full display
+    def scale_display(self):
+        pygame.transform.scale(self.display, self.screen.get_size(), self.screen)
+
+    # draw overlays and present the frame
+    def render(self):
+        self.codex.render_book_icon()
+
+        # Render the codex if active
+        if self.codex.codex_active:
+            self.codex.render_codex()
+        if self.dialogue_handler.dialogue_active:
+            self.dialogue_handler.render_dialogue_box(self.dialogue_display)
+
+            # Blit the dialogue_surface onto the game_screen
+            # Since game_screen has been transformed, we blit the dialogue_surface over it without any transformation
+        self.screen.blit(self.dialogue_display, (0, 0))
+        pygame.display.update()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Supervised game')
+    parser.add_argument('--seed', type=int, help='seed of the entity ai (random by default)')
+    parser.add_argument('--record', help='write keyboard and mouse input to this replay file')
+    parser.add_argument('--replay', help='play back a replay file')
+    parser.add_argument('--headless', action='store_true', help='no window and no fps limit (use with --replay)')
+    parser.add_argument('--threaded', action='store_true', help='simulate on a worker thread while the last frame is drawn (one frame of extra latency)')
+    parser.add_argument('--fps', type=int, default=RENDER_FPS, help='frame rate limit of the rendering, 0 for no limit (the simulation always runs at 60 ticks per second)')
+    parser.add_argument('--captures', default='', help='dataset directory the flash captures are added to and the lens is trained on (off by default)')
+    args = parser.parse_args()
+
+    game = Game(seed=args.seed, headless=args.headless, record=args.record, replay=args.replay)
+    game.render_fps = args.fps
+    game.threaded = args.threaded
+    if args.captures:
+        game.capture_writer = CaptureWriter(args.captures)
+        game.lens = Lens(args.captures)
+    start = time.perf_counter()
+    game.run()
+    if game.headless:
+        print(f'{game.frame} ticks in {time.perf_counter() - start:.2f}s')
+    pygame.quit()
+    sys.exit()
@@ -0,0 +1,142 @@
+import argparse
+import json
+import random
+
+import numpy as np
+
+from scripts.mapfile import atomic_write
+from scripts.registry import PHYSICS_TILES
+
+GRASS = 0
+WATER = 1
+
+GROUND_VARIANT = 4      # plain (center) variant of grass and water
+# (type, variants) of the scattered objects, ground decor most often
+# decor 0 is a totem and decor 2 - 4 are the knn lanterns (see Tilemap.get_totems / get_knn), they are never scattered
+DECOR = [('ground_decor', range(10)), ('decor', (1,)), ('tree', range(7))]
+DECOR_WEIGHTS = [8, 1, 1]
+
+
+# grid of GRASS / WATER: water lakes (random discs) until the water share is reached
+def make_ground(rng, width, height, water, lake_radius):
+    ground = np.full((height, width), GRASS, dtype=np.uint8)
+    target = int(width * height * water)
+    ys, xs = np.ogrid[:height, :width]
+    while target and np.count_nonzero(ground) < target:
+        radius = rng.uniform(lake_radius / 2, lake_radius * 1.5)
+        cx = rng.uniform(0, width)
+        cy = rng.uniform(0, height)
+        y0, y1 = max(0, int(cy - radius)), min(height, int(cy + radius) + 1)
+        x0, x1 = max(0, int(cx - radius)), min(width, int(cx + radius) + 1)
+        lake = (xs[:, x0:x1] - cx) ** 2 + (ys[y0:y1] - cy) ** 2 <= radius ** 2
+        ground[y0:y1, x0:x1][lake] = WATER
+    return ground
+
+
+# stone variants that block the one cell they are placed on (one cell wide with a physics rect of some height, see
+# Tilemap.obstacle_cells), the flat ones can be walked over
+def blocking_stones(tile_size):
+    return [variant for variant, (rect_width, rect_height, offset) in sorted(PHYSICS_TILES['stone'].items())
+            if rect_width <= tile_size and rect_height > 0]
+
+
+# stone obstacles in short walls on grass, aligned to the grid
+def make_stones(rng, ground, count, tile_size):
+    height, width = ground.shape
+    variants = blocking_stones(tile_size)
+    stones = []
+    occupied = set()
+    for _ in range(count):
+        x = rng.randrange(width)
+        y = rng.randrange(height)
+        dx, dy = rng.choice([(1, 0), (0, 1)])
+        for i in range(rng.randint(1, 6)):
+            cell = (x + dx * i, y + dy * i)
+            if cell[0] >= width or cell[1] >= height or ground[cell[1], cell[0]] != GRASS or cell in occupied:
+                break
+            occupied.add(cell)
+            stones.append(('stone', rng.choice(variants), cell[0] * tile_size, cell[1] * tile_size))
+    return stones, occupied
+
+
+# random position (pixels) on a free grass cell
+def grass_position(rng, ground, blocked, tile_size):
+    height, width = ground.shape
+    for _ in range(1000):
+        x = rng.randrange(width)
+        y = rng.randrange(height)
+        if ground[y, x] == GRASS and (x, y) not in blocked:
+            return x * tile_size + rng.uniform(0, tile_size / 2), y * tile_size + rng.uniform(0, tile_size / 2)
+    raise ValueError('no free grass cell found, lower --water or --stones')
+
+
+# offgrid objects: stones, scattered decor and the spawners (one player, counts of the other variants)
+def make_offgrid(rng, ground, args):
+    stones, blocked = make_stones(rng, ground, args.stones, args.tile_size)
+    offgrid = list(stones)
+
+    for _ in range(int(ground.size * args.density / 100)):
+        tile_type, variants = rng.choices(DECOR, weights=DECOR_WEIGHTS)[0]
+        x, y = grass_position(rng, ground, blocked, args.tile_size)
+        offgrid.append((tile_type, rng.choice(variants), x, y))
+
+    spawners = {0: 1, 1: args.lights, 2: args.npcs, 3: args.enemies, 4: args.shadows}
+    for variant, count in spawners.items():
+        for _ in range(count):
+            x, y = grass_position(rng, ground, blocked, args.tile_size)
+            offgrid.append(('spawners', variant, x, y))
+    return offgrid
+
+
+# empty cells next to the map (what Tilemap.autotile would find)
+def make_border(width, height):
+    border = [(-1, y) for y in range(height)] + [(width, y) for y in range(height)]
+    border += [(x, -1) for x in range(width)] + [(x, height) for x in range(width)]
+    return sorted(border)
+
+
+def tile_json(tile_type, variant, x, y):
+    return json.dumps({'type': tile_type, 'variant': variant, 'pos': [x, y]})
+
+
+# streams the map in the format of Tilemap.save, a million tiles never exist as python objects at once
+def write_map(path, ground, offgrid, border, tile_size):
+    names = {GRASS: 'grass', WATER: 'water'}
+    with atomic_write(path) as f:
+        f.write('{"tilemap": {')
+        first = True
+        for y, row in enumerate(ground.tolist()):
+            for x, kind in enumerate(row):
+                f.write(('' if first else ', ') + f'"{x};{y}": ' + tile_json(names[kind], GROUND_VARIANT, x, y))
+                first = False
+        f.write('}, "tile_size": ' + str(tile_size))
+        f.write(', "offgrid": [' + ', '.join(tile_json(*tile) for tile in offgrid) + ']')
+        f.write(', "border": ' + json.dumps([list(loc) for loc in border]) + '}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate large maps for scaling tests (play them with batch.py --maps ...)')
+    parser.add_argument('out', help='map file to write')
+    parser.add_argument('--width', type=int, default=256, help='cells')
+    parser.add_argument('--height', type=int, default=256, help='cells')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tile-size', type=int, default=16)
+    parser.add_argument('--water', type=float, default=0.2, help='share of the cells covered by water lakes (solid)')
+    parser.add_argument('--lake-radius', type=float, default=8, help='mean lake radius in cells')
+    parser.add_argument('--stones', type=int, default=None, help='stone walls on grass (default: one per 200 cells)')
+    parser.add_argument('--density', type=float, default=3, help='decor objects per 100 cells')
+    parser.add_argument('--lights', type=int, default=10, help='light spawners (variant 1)')
+    parser.add_argument('--npcs', type=int, default=1, help='npc spawners (variant 2)')
+    parser.add_argument('--enemies', type=int, default=20, help='enemy spawners (variant 3)')
+    parser.add_argument('--shadows', type=int, default=10, help='shadow spawners (variant 4)')
+    args = parser.parse_args()
+    if not 0 <= args.water < 1:
+        parser.error('--water must be at least 0 and below 1')
+    if args.stones is None:
+        args.stones = args.width * args.height // 200
+
+    rng = random.Random(args.seed)
+    ground = make_ground(rng, args.width, args.height, args.water, args.lake_radius)
+    offgrid = make_offgrid(rng, ground, args)
+    write_map(args.out, ground, offgrid, make_border(args.width, args.height), args.tile_size)
+    print(f'{args.out}: {ground.size} tiles ({np.count_nonzero(ground == WATER)} water), {len(offgrid)} offgrid objects')
@@ -0,0 +1,151 @@
+import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from scripts.registry import TILE_TYPES
+from scripts.mapfile import read_chunked
+from scripts.utils import load_image, load_images, load_transparent_images, Animation
+
+SPRITE_BACKGROUND = (0, 255, 43)    # colorkey of the enemy and npc sprites
+DIRECTIONS = ('side', 'front', 'back')
+
+
+def load_animation(path, img_dur, load=load_images, **kwargs):
+    return Animation(load(path, **kwargs), img_dur=img_dur)
+
+
+# loaders of the animations of an entity, actions: [(action, img_dur), ...], every action has the three directions
+def animations(entity, actions, load=load_images, **kwargs):
+    loaders = {}
+    for action, img_dur in actions:
+        for direction in DIRECTIONS:
+            key = entity + '/' + action + '/' + direction
+            loaders[key] = partial(load_animation, 'entities/' + key, img_dur, load, **kwargs)
+    return loaders
+
+
+# group name: {asset key: loader}, a group is loaded and dropped as a whole
+ASSET_GROUPS = {
+    'tiles': {tile_type: partial(load_images, 'tiles/' + tile_type) for tile_type in TILE_TYPES},
+    'background': {'background': partial(load_image, 'background.png')},
+    'splash': {'background2': partial(load_image, 'background2.png')},
+    'intro': {'background2_dimmed': partial(load_image, 'background/start/05.png'),
+              'bg_dimmed': partial(load_images, 'background/start')},
+    'player': {'player': partial(load_image, 'entities/player.png'),
+               **animations('player', [('idle', 6), ('run', 5), ('slash', 5)])},
+    'light': animations('light', [('idle', 6), ('walk', 5)], load_transparent_images),
+    'enemy': {**animations('enemy', [('attack', 5)], background=SPRITE_BACKGROUND),
+              'enemy/death': partial(load_animation, 'entities/enemy/death', 5, background=SPRITE_BACKGROUND),
+              **animations('enemy', [('idle', 6), ('walk', 5)], background=SPRITE_BACKGROUND)},
+    'npc': {'npc/idle/side': partial(load_animation, 'entities/npc/idle/side', 24, background=SPRITE_BACKGROUND)},
+    'shadow-eye-glow': animations('shadow-eye-glow', [('idle', 6), ('walk', 5)], load_transparent_images),
+}
+RESIDENT_GROUPS = ('tiles', 'background', 'player')     # used on every level, never dropped
+SPAWNER_GROUPS = {0: 'player', 1: 'light', 2: 'npc', 3: 'enemy', 4: 'shadow-eye-glow'}    # see Game.spawn
+
+
+# groups the entities of the spawner variants need (unknown variants spawn enemies)
+def spawner_groups(variants):
+    return {SPAWNER_GROUPS.get(variant, 'enemy') for variant in variants}
+
+
+# spawner variants placed on a map file (json or chunked, see Tilemap.load)
+def map_spawner_variants(path):
+    if os.path.isdir(path):
+        map_data = read_chunked(path)
+    else:
+        with open(path, 'r') as f:
+            map_data = json.load(f)
+    tiles = list(map_data['tilemap'].values()) + map_data['offgrid']
+    return {tile['variant'] for tile in tiles if tile['type'] == 'spawners'}
+
+
+# game assets, loaded per group when a level needs them instead of all at startup
+# load_level hands over the groups of the new level (use_level), groups no level references any more are dropped, while a
+# level is played the groups of the next one are loaded on a background thread (prefetch_level)
+# reads (assets[key]) work like the old asset dict, a group nobody acquired is loaded on first use
+class AssetManager:
+    def __init__(self, groups=ASSET_GROUPS, resident=RESIDENT_GROUPS):
+        self.groups = groups
+        self.group_of = {key: name for name, loaders in groups.items() for key in loaders}
+        self.loaded = {}            # group name: {asset key: asset}
+        self.refs = Counter()
+        self.level_groups = set()
+        self.prefetch_path = None
+        self.prefetch_future = None     # background load of the groups of the next level, {group name: assets}
+        self.prefetched = set()         # groups kept without a reference until the next level is loaded
+        self.loader = ThreadPoolExecutor(max_workers=1)
+
+        for name in resident:
+            self.acquire(name)
+
+    def __getitem__(self, key):
+        name = self.group_of[key]
+        group = self.loaded.get(name)
+        if group is None:
+            group = self.load(name)
+        return group[key]
+
+    def load_group(self, name):
+        return {key: loader() for key, loader in self.groups[name].items()}
+
+    def load(self, name):
+        self.take_prefetch()
+        if name not in self.loaded:
+            self.loaded[name] = self.load_group(name)
+        return self.loaded[name]
+
+    # waits for the running prefetch and keeps what it loaded
+    def take_prefetch(self):
+        if self.prefetch_future is not None:
+            future, self.prefetch_future = self.prefetch_future, None
+            for name, group in future.result().items():
+                self.loaded.setdefault(name, group)
+                self.prefetched.add(name)
+
+    def acquire(self, name):
+        self.load(name)
+        self.refs[name] += 1
+
+    def release(self, name):
+        self.refs[name] -= 1
+        if not self.refs[name] and name not in self.prefetched:
+            self.loaded.pop(name, None)
+
+    # groups the level being loaded needs, acquired before the ones of the last level are released so shared groups stay
+    def use_level(self, names):
+        names = set(names)
+        for name in names:
+            self.acquire(name)
+        for name in self.level_groups:
+            self.release(name)
+        self.level_groups = names
+        self.drop_unused()
+
+    def drop_unused(self):
+        for name in list(self.loaded):
+            if not self.refs[name] and name not in self.prefetched:
+                del self.loaded[name]
+
+    # start loading the groups of the map at path (and of the extra spawner variants) in the background
+    def prefetch_level(self, path, variants=()):
+        if path == self.prefetch_path:
+            return
+        self.take_prefetch()
+        self.prefetch_path = path
+        self.prefetched = set()
+        self.drop_unused()
+        self.prefetch_future = self.loader.submit(self.prefetch, path, set(variants), set(self.loaded))
+
+    # runs on the loader thread, returns the groups the map needs that were not loaded yet
+    def prefetch(self, path, variants, loaded):
+        try:
+            variants |= map_spawner_variants(path)
+        except (OSError, ValueError, KeyError):
+            return {}   # load_level reports the broken map
+        return {name: self.load_group(name) for name in spawner_groups(variants) - loaded}
+
+    def close(self):
+        self.loader.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,73 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import pygame
+
+MANIFEST = 'manifest.jsonl'     # one json line per captured image
+IMAGE_DIR = 'images'
+QUEUE_SIZE = 1024               # captures waiting for the writer, more are dropped instead of stalling the game
+BATCH_SIZE = 64                 # captures written per flush at most
+FLUSH_DELAY = 0.5               # seconds the writer waits for more captures before flushing a batch
+
+
+# dataset of the flash captures: the sprite of the entity as png in images/ and a manifest line with its label
+# (light or shadow) and where it was taken
+# capture only copies the pixels and queues them, a writer thread encodes the pngs and appends the manifest in batches
+class CaptureWriter:
+    def __init__(self, path):
+        self.path = path
+        self.session = time.strftime('%Y%m%d-%H%M%S')    # prefix of the image names, sessions append to the same dataset
+        self.count = 0
+        self.dropped = 0
+        self.error = None
+
+        os.makedirs(os.path.join(path, IMAGE_DIR), exist_ok=True)
+        self.jobs = queue.Queue(maxsize=QUEUE_SIZE)
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    # called by the simulation when the flash hits entity
+    def capture(self, entity, label, level, tick):
+        image = pygame.transform.flip(entity.animation.img(), entity.flip, False)
+        record = {'file': IMAGE_DIR + '/' + self.session + '_' + str(self.count) + '.png', 'label': label,
+                  'type': entity.type, 'level': level, 'tick': tick, 'pos': list(entity.pos), 'size': list(image.get_size())}
+        try:
+            self.jobs.put_nowait((record, pygame.image.tobytes(image, 'RGBA')))
+            self.count += 1
+        except queue.Full:
+            self.dropped += 1
+
+    # write the pending captures and stop the worker
+    def close(self):
+        self.jobs.put(None)
+        self.worker.join()
+
+    def run(self):
+        done = False
+        while not done:
+            batch = [self.jobs.get()]
+            # collect what arrives shortly after, so a sweep over a cluster is one flush
+            while len(batch) < BATCH_SIZE and batch[-1] is not None:
+                try:
+                    batch.append(self.jobs.get(timeout=FLUSH_DELAY))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                done = True
+                batch.pop()
+            try:
+                self.write(batch)
+            except Exception as e:
+                self.error = e
+                print('writing captures to', self.path, 'failed:', e)
+
+    # images first, so the manifest never lists a missing file
+    def write(self, batch):
+        for record, pixels in batch:
+            image = pygame.image.frombytes(pixels, record['size'], 'RGBA')
+            pygame.image.save(image, os.path.join(self.path, record['file']))
+        with open(os.path.join(self.path, MANIFEST), 'a') as f:
+            f.write(''.join(json.dumps(record) + '\n' for record, pixels in batch))
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+
+import pygame
+
+CHUNK_SIZE = 16         # tiles per chunk side
+MAX_CHUNKS = 256        # full resolution chunk surfaces kept in memory (least recently used ones are dropped)
+OVERVIEW_SCALE = 4      # the overview shows the map this many times smaller
+
+
+# pre-rendered chunks of the map for the editor
+# every chunk surface holds the grid tiles, offgrid tiles and border tiles overlapping it (same result as Tilemap.render)
+# chunks are only redrawn after an edit touched them, downscaled copies (mipmaps) are used for the overview
+class ChunkRenderer:
+    def __init__(self, tilemap, chunk_size=CHUNK_SIZE, max_chunks=MAX_CHUNKS):
+        self.tilemap = tilemap
+        self.image = tilemap.registry.image
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+
+        self.surfaces = OrderedDict()   # chunk: surface, in least recently used order
+        self.mipmaps = {}               # chunk: {scale: downscaled surface}
+        self.offgrid_chunks = {}        # chunk: offgrid tiles overlapping it, in placement order
+        self.border_chunks = {}         # chunk: border tiles (debug view) overlapping it
+
+        # grid tile images can be larger than a cell (trees, big stones), this many cells spill into the next chunk
+        self.spill = max(max(img.get_width(), img.get_height()) - 1 for img in tilemap.registry.images) // tilemap.tile_size
+
+        self.reset()
+        tilemap.listeners.append(self.on_change)
+
+    @property
+    def chunk_px(self):
+        return self.chunk_size * self.tilemap.tile_size
+
+    def reset(self):
+        self.surfaces.clear()
+        self.mipmaps.clear()
+        self.offgrid_chunks = {}
+        self.border_chunks = {}
+        for tile in self.tilemap.offgrid_tiles:
+            for chunk in self.image_chunks(tile, tile.pos):
+                self.offgrid_chunks.setdefault(chunk, []).append(tile)
+        for tile in self.tilemap.border_tiles:
+            for chunk in self.image_chunks(tile, (tile.pos[0] * self.tilemap.tile_size, tile.pos[1] * self.tilemap.tile_size)):
+                self.border_chunks.setdefault(chunk, []).append(tile)
+
+    # chunks overlapped by the image of a tile drawn at pixel position pos
+    def image_chunks(self, tile, pos):
+        img = self.image(tile.type, tile.variant)
+        x0 = int(pos[0] // self.chunk_px)
+        y0 = int(pos[1] // self.chunk_px)
+        x1 = int((pos[0] + img.get_width() - 1) // self.chunk_px)
+        y1 = int((pos[1] + img.get_height() - 1) // self.chunk_px)
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    # chunks a grid tile at cell can be drawn on
+    def cell_chunks(self, cell):
+        x0 = int(cell[0] // self.chunk_size)
+        y0 = int(cell[1] // self.chunk_size)
+        x1 = int((cell[0] + self.spill) // self.chunk_size)
+        y1 = int((cell[1] + self.spill) // self.chunk_size)
+        return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+    def invalidate(self, chunk):
+        self.surfaces.pop(chunk, None)
+        self.mipmaps.pop(chunk, None)
+
+    # listener of Tilemap.notify
+    def on_change(self, change):
+        kind = change[0]
+        if kind == 'tiles':
+            chunks = set()
+            for loc, old, new in change[1]:
+                chunks.update(self.cell_chunks(loc))
+            for chunk in chunks:
+                self.invalidate(chunk)
+        elif kind == 'variant':
+            for chunk in self.cell_chunks(change[1]):
+                self.invalidate(chunk)
+        elif kind == 'offgrid':
+            tiles, added = change[1], change[2]
+            chunks = set()
+            for tile in tiles:
+                chunks.update(self.image_chunks(tile, tile.pos))
+            if added:
+                for tile in tiles:
+                    for chunk in self.image_chunks(tile, tile.pos):
+                        self.offgrid_chunks.setdefault(chunk, []).append(tile)
+            else:
+                removed = {id(tile) for tile in tiles}
+                for chunk in chunks:
+                    self.offgrid_chunks[chunk] = [tile for tile in self.offgrid_chunks[chunk] if id(tile) not in removed]
+            for chunk in chunks:
+                self.invalidate(chunk)
+        elif kind == 'reset':
+            self.reset()
+        # border cells are not drawn (only the border tiles of the debug view)
+
+    def draw_chunk(self, chunk):
+        tile_size = self.tilemap.tile_size
+        origin = (chunk[0] * self.chunk_px, chunk[1] * self.chunk_px)
+        surf = pygame.Surface((self.chunk_px, self.chunk_px)).convert()
+
+        for x in range(chunk[0] * self.chunk_size - self.spill, (chunk[0] + 1) * self.chunk_size):
+            for y in range(chunk[1] * self.chunk_size - self.spill, (chunk[1] + 1) * self.chunk_size):
+                tile = self.tilemap.tilemap.get(str(x) + ';' + str(y))
+                if tile is not None:
+                    surf.blit(self.image(tile.type, tile.variant), (x * tile_size - origin[0], y * tile_size - origin[1]))
+
+        for tile in self.offgrid_chunks.get(chunk, ()):
+            surf.blit(self.image(tile.type, tile.variant), (tile.pos[0] - origin[0], tile.pos[1] - origin[1]))
+
+        for tile in self.border_chunks.get(chunk, ()):
+            surf.blit(self.image(tile.type, tile.variant), (tile.pos[0] * tile_size - origin[0], tile.pos[1] * tile_size - origin[1]))
+        return surf
+
+    def chunk_surface(self, chunk):
+        surf = self.surfaces.get(chunk)
+        if surf is None:
+            surf = self.draw_chunk(chunk)
+            self.surfaces[chunk] = surf
+            if len(self.surfaces) > self.max_chunks:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(chunk)
+        return surf
+
+    def mipmap(self, chunk, scale):
+        levels = self.mipmaps.setdefault(chunk, {})
+        surf = levels.get(scale)
+        if surf is None:
+            size = self.chunk_px // scale
+            surf = pygame.transform.smoothscale(self.chunk_surface(chunk), (size, size))
+            levels[scale] = surf
+        return surf
+
+    def visible_chunks(self, offset, width, height):
+        for x in range(int(offset[0] // self.chunk_px), int((offset[0] + width) // self.chunk_px) + 1):
+            for y in range(int(offset[1] // self.chunk_px), int((offset[1] + height) // self.chunk_px) + 1):
+                yield x, y
+
+    # render the chunks on screen, offset used for cam
+    def render(self, surf, offset=(0, 0)):
+        for chunk in self.visible_chunks(offset, surf.get_width(), surf.get_height()):
+            surf.blit(self.chunk_surface(chunk), (chunk[0] * self.chunk_px - offset[0], chunk[1] * self.chunk_px - offset[1]))
+
+    # zoomed out view, surf shows scale times more of the map (offset in map pixels)
+    def render_overview(self, surf, offset=(0, 0), scale=OVERVIEW_SCALE):
+        for chunk in self.visible_chunks(offset, surf.get_width() * scale, surf.get_height() * scale):
+            surf.blit(self.mipmap(chunk, scale), ((chunk[0] * self.chunk_px - offset[0]) // scale, (chunk[1] * self.chunk_px - offset[1]) // scale))
@@ -0,0 +1,216 @@
+import pygame
+
+from scripts.tilemap import CELL_SOLID
+
+# contact flags, combined into the PhysicsEntity.collisions bitmask
+COLLIDE_UP = 1
+COLLIDE_DOWN = 2
+COLLIDE_RIGHT = 4
+COLLIDE_LEFT = 8
+
+PLACE_CELLS = 4     # cells around a spawn position free_position looks for a free spot in
+BATCH_CELLS = 4     # cells per side of the blocks move_many gathers the rects of at once
+
+
+# collision resolution of the entities against the physics rects of the map
+# the rects are cached by the cell they belong to (grid tile, border cell or grid aligned offgrid tile) and dropped when the
+# tilemap notifies a change there, every move gathers its neighbourhood once from the swept bounds and resolves both axes
+# against it, so fast entities are stopped by everything on their way instead of skipping thin rects
+class Collider:
+    def __init__(self, tilemap):
+        self.tilemap = tilemap
+
+        self.cell_rects = {}    # (x, y): rects anchored on the cell
+        self.aligned = {}       # (x, y): offgrid physics tiles placed exactly on the cell (only those collide)
+        self.reach_x = 0        # cells a rect can extend right / down of the cell it is anchored on
+        self.reach_y = 0
+
+        self.reset()
+        tilemap.listeners.append(self.on_change)
+
+    def reset(self):
+        self.cell_rects = {}
+        self.aligned = {}
+        for tile in self.tilemap.offgrid_tiles:
+            self.add_aligned(tile)
+        self.reach_x, self.reach_y = self.tilemap.registry.reach(self.tilemap.tile_size)
+
+    def aligned_cell(self, tile):
+        tile_size = self.tilemap.tile_size
+        registry = self.tilemap.registry
+        if not registry.solid[registry.tile_id(tile.type, tile.variant)] or tile.pos[0] % tile_size or tile.pos[1] % tile_size:
+            return None
+        return int(tile.pos[0] // tile_size), int(tile.pos[1] // tile_size)
+
+    def add_aligned(self, tile):
+        cell = self.aligned_cell(tile)
+        if cell is not None:
+            self.aligned.setdefault(cell, []).append(tile)
+            self.cell_rects.pop(cell, None)
+
+    def remove_aligned(self, tile):
+        cell = self.aligned_cell(tile)
+        if cell is not None and cell in self.aligned:
+            self.aligned[cell] = [other for other in self.aligned[cell] if other is not tile]
+            if not self.aligned[cell]:
+                del self.aligned[cell]
+            self.cell_rects.pop(cell, None)
+
+    # listener of Tilemap.notify
+    def on_change(self, change):
+        kind = change[0]
+        if kind == 'tiles':
+            for loc, old, new in change[1]:
+                self.cell_rects.pop(loc, None)
+        elif kind in ('variant', 'border'):
+            self.cell_rects.pop(change[1], None)
+        elif kind == 'offgrid':
+            for tile in change[1]:
+                if change[2]:
+                    self.add_aligned(tile)
+                else:
+                    self.remove_aligned(tile)
+        elif kind == 'reset':
+            self.reset()
+
+    # physics rects anchored on a cell (same rects as the old per axis neighbour query)
+    def rects_of(self, cell):
+        tilemap = self.tilemap
+        tile_size = tilemap.tile_size
+        registry = tilemap.registry
+        rects = []
+        tile = tilemap.tilemap.get(str(cell[0]) + ';' + str(cell[1]))
+        tiles = ([tile] if tile is not None else []) + self.aligned.get(cell, [])
+        for tile in tiles:
+            physics = registry.physics[registry.tile_id(tile.type, tile.variant)]
+            if physics is not None:
+                width, height, vertical_offset = physics
+                rects.append(pygame.Rect(cell[0] * tile_size, cell[1] * tile_size + vertical_offset, width, height))
+        if cell in tilemap.border:
+            rects.append(pygame.Rect(cell[0] * tile_size, cell[1] * tile_size, tile_size, tile_size))
+        self.cell_rects[cell] = rects
+        return rects
+
+    # physics rects touching bounds (pixels), only cells that are solid or carry an offgrid obstacle are looked at
+    def gather(self, bounds):
+        tilemap = self.tilemap
+        tile_size = tilemap.tile_size
+        cell_rects = self.cell_rects
+        aligned = self.aligned
+        flags = tilemap.cell_flags
+        grid_x, grid_y, grid_width, grid_height = tilemap.grid_x, tilemap.grid_y, tilemap.grid_width, tilemap.grid_height
+
+        found = []
+        for x in range(bounds.left // tile_size - self.reach_x, (bounds.right - 1) // tile_size + 1):
+            for y in range(bounds.top // tile_size - self.reach_y, (bounds.bottom - 1) // tile_size + 1):
+                cell = (x, y)
+                gx = x - grid_x
+                gy = y - grid_y
+                solid = 0 <= gx < grid_width and 0 <= gy < grid_height and flags[gy * grid_width + gx] & CELL_SOLID
+                if not solid and cell not in aligned:
+                    continue
+                rects = cell_rects.get(cell)
+                if rects is None:
+                    rects = self.rects_of(cell)
+                for rect in rects:
+                    if rect.colliderect(bounds):
+                        found.append(rect)
+        return found
+
+    # move entity by movement (pixels), resolving x then y, returns the COLLIDE_* contacts
+    # rects is the neighbourhood gathered for the move (see move_many), the swept bounds of the entity by default
+    def move(self, entity, movement, rects=None):
+        if not movement[0] and not movement[1]:    # idle entities never look at the map
+            entity.collisions = 0
+            return 0
+        pos = entity.pos
+        size = entity.size
+        start = pygame.Rect(pos[0], pos[1], size[0], size[1])
+        if rects is None:
+            rects = self.gather(self.swept(entity, movement))
+        contacts = 0
+
+        # horizontal: the closest rect on the way stops the entity, rects it still overlaps after the move push it back out
+        # against the direction of movement (like the old per rect snapping)
+        if movement[0]:
+            pos[0] += movement[0]
+            end = pygame.Rect(pos[0], pos[1], size[0], size[1])
+            sweep = start.union(end)
+            if movement[0] > 0:
+                edges = [rect.left for rect in rects if rect.colliderect(end) or (rect.colliderect(sweep) and not rect.colliderect(start))]
+                if edges:
+                    end.right = min(edges)
+                    pos[0] = end.x
+                    contacts |= COLLIDE_RIGHT
+            else:
+                edges = [rect.right for rect in rects if rect.colliderect(end) or (rect.colliderect(sweep) and not rect.colliderect(start))]
+                if edges:
+                    end.left = max(edges)
+                    pos[0] = end.x
+                    contacts |= COLLIDE_LEFT
+
+        # vertical, from where the horizontal move ended
+        if movement[1]:
+            start = pygame.Rect(pos[0], pos[1], size[0], size[1])
+            pos[1] += movement[1]
+            end = pygame.Rect(pos[0], pos[1], size[0], size[1])
+            sweep = start.union(end)
+            if movement[1] > 0:
+                edges = [rect.top for rect in rects if rect.colliderect(end) or (rect.colliderect(sweep) and not rect.colliderect(start))]
+                if edges:
+                    end.bottom = min(edges)
+                    pos[1] = end.y
+                    contacts |= COLLIDE_DOWN
+            else:
+                edges = [rect.bottom for rect in rects if rect.colliderect(end) or (rect.colliderect(sweep) and not rect.colliderect(start))]
+                if edges:
+                    end.top = max(edges)
+                    pos[1] = end.y
+                    contacts |= COLLIDE_UP
+
+        entity.collisions = contacts
+        return contacts
+
+    # closest position to pos (pixels) where an entity of size overlaps no physics rect, pos itself if it is free
+    # the candidates are the spots just outside the rects within PLACE_CELLS cells, shifted along one axis
+    def free_position(self, pos, size):
+        rect = pygame.Rect(pos[0], pos[1], size[0], size[1])
+        reach = PLACE_CELLS * self.tilemap.tile_size
+        rects = self.gather(rect.inflate(2 * reach, 2 * reach))
+        if not any(other.colliderect(rect) for other in rects):
+            return list(pos)
+        candidates = []
+        for other in rects:
+            candidates += [(other.left - size[0], pos[1]), (other.right, pos[1]), (pos[0], other.top - size[1]), (pos[0], other.bottom)]
+        candidates.sort(key=lambda candidate: (candidate[0] - pos[0]) ** 2 + (candidate[1] - pos[1]) ** 2)
+        for x, y in candidates:
+            rect = pygame.Rect(x, y, size[0], size[1])
+            if not any(other.colliderect(rect) for other in self.gather(rect)):
+                return [x, y]
+        return list(pos)
+
+    # bounds of the entity over the whole move (both axes)
+    def swept(self, entity, movement):
+        pos = entity.pos
+        size = entity.size
+        return pygame.Rect(pos[0], pos[1], size[0], size[1]).union(
+            pygame.Rect(pos[0] + movement[0], pos[1] + movement[1], size[0], size[1]))
+
+    # move many entities (movements in the same order), returns their contacts
+    # the moving entities are grouped by the block of BATCH_CELLS x BATCH_CELLS cells they start in, the rects of a group
+    # are gathered once from the union of its swept bounds and every entity of the group is resolved against them
+    def move_many(self, entities, movements):
+        block = BATCH_CELLS * self.tilemap.tile_size
+        groups = {}     # block: [(entity, movement), ...]
+        for entity, movement in zip(entities, movements):
+            if movement[0] or movement[1]:
+                groups.setdefault((int(entity.pos[0] // block), int(entity.pos[1] // block)), []).append((entity, movement))
+            else:
+                entity.collisions = 0
+        for group in groups.values():
+            bounds = self.swept(*group[0])
+            bounds.unionall_ip([self.swept(entity, movement) for entity, movement in group[1:]])
+            rects = self.gather(bounds)
+            for entity, movement in group:
+                self.move(entity, movement, rects)
+        return [entity.collisions for entity in entities]
@@ -1,8 +1,9 @@
-import random
 import sys
-import math
 import pygame
 
+from scripts.records import RenderEntry
+from scripts.utils import render_prompt
+
 
 ENTITY_OFFSETS = {
     'player': 4,
@@ -14,14 +15,18 @@ ENTITY_OFFSETS = {
 
 
 class PhysicsEntity:
+    __slots__ = ('game', 'type', 'pos', 'prev_pos', 'size', 'velocity', 'max_velocity', 'collisions',
+                 'action', 'anim_offset', 'flip', 'animation', 'attack_cd')
+
     def __init__(self, game, e_type, pos, size):
         self.game = game
         self.type = e_type
         self.pos = list(pos)
+        self.prev_pos = list(pos)   # position at the start of the current simulation tick
         self.size = size
         self.velocity = [0.0, 0.0]
         self.max_velocity = 5
-        self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}
+        self.collisions = 0
 
         self.action = ''
         self.anim_offset = (-3, -3)
@@ -35,78 +40,59 @@ class PhysicsEntity:
     def rect_offset(self, offset=(0, 0)):
         return pygame.Rect(self.pos[0] - offset[0], self.pos[1] - offset[1], self.size[0], self.size[1])
 
+    # called at the start of every simulation tick, rendering interpolates between prev_pos and pos
+    def begin_tick(self):
+        self.prev_pos[0] = self.pos[0]
+        self.prev_pos[1] = self.pos[1]
+
+    # jump to pos without interpolating from the old position
+    def teleport(self, pos):
+        self.pos = list(pos)
+        self.prev_pos = list(pos)
+
+    # render offset that draws the entity alpha (0 - 1) of the way from prev_pos to pos
+    def lerp_offset(self, offset, alpha):
+        return (offset[0] + (self.pos[0] - self.prev_pos[0]) * (1 - alpha), offset[1] + (self.pos[1] - self.prev_pos[1]) * (1 - alpha))
+
     def set_action(self, action):
         if action != self.action:
             self.action = action
             self.animation = self.game.assets[self.type + '/' + self.action].copy()
 
-    def update(self, tilemap, movement=(0, 0)):
-        # reset collision info
-        self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}
-
-        # contains movement directions
-        frame_movement = (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
-
-        # move player position horizontally
-        self.pos[0] += frame_movement[0]
-        # collision checks
-        entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
-                # moving right
-                if frame_movement[0] > 0:
-                    entity_rect.right = rect.left
-                    self.collisions['right'] = True
-                # moving left
-                if frame_movement[0] < 0:
-                    entity_rect.left = rect.right
-                    self.collisions['left'] = True
-                # update the players position according to it's rect
-                self.pos[0] = entity_rect.x
-
-        # move player position vertically
-        self.pos[1] += frame_movement[1]
-        # collision checks
-        entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
-                # moving down
-                if frame_movement[1] > 0:
-                    entity_rect.bottom = rect.top
-                    self.collisions['down'] = True
-
-                # moving up
-                if frame_movement[1] < 0:
-                    entity_rect.top = rect.bottom
-                    self.collisions['up'] = True
-                # update the players position according to it's rect
-                self.pos[1] = entity_rect.y
-
+    # movement of the tick before collisions, the ai of the entities decides here
+    def plan(self, tilemap, movement):
+        return movement
 
+    # facing and animation after the move
+    def after_move(self, movement):
         if movement[0] > 0:
             self.flip = False
         if movement[0] < 0:
             self.flip = True
 
-        '''
-        # set a terminal velocity using min
-        self.velocity[1] = min(self.max_velocity, self.velocity[1] + 0.1)
+        self.animation.update()
 
-        if self.collisions['down'] or self.collisions['up']:
-            self.velocity[1] = 0
-        '''
+    # one tick: plan, move and resolve collisions (see Collider.move, Game.update_entities moves many entities at once)
+    def update(self, tilemap, movement=(0, 0)):
+        movement = self.plan(tilemap, movement)
+        self.game.collider.move(self, self.frame_movement(movement))
+        self.after_move(movement)
 
-        self.animation.update()
+    # contains movement directions
+    def frame_movement(self, movement):
+        return movement[0] + self.velocity[0], movement[1] + self.velocity[1]
 
     def render(self, surf, offset=(0, 0)):
         surf.blit(pygame.transform.flip(self.animation.img(), self.flip, False),
                   (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[0]))
 
-    def render_order(self, offset=(0, 0)):
-        return {'type': 'override with type', 'pos_adj': (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[0])}
+    def render_order(self):
+        return RenderEntry('override with type', self.pos[1] + self.anim_offset[0], entity=self)
 
 
 class Enemy(PhysicsEntity):
+    __slots__ = ('walking_horizontal', 'walking_vertical', 'rng')
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'enemy', pos, size)
 
@@ -114,31 +100,41 @@ class Enemy(PhysicsEntity):
         self.walking_vertical = 0
         self.rng = 0
 
-    def update(self, tilemap, movement=(0, 0)):
-        self.rng = random.random()
-
-        if self.walking_horizontal:
-            if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1])):
-                movement = (movement[0] - 0.5 if self.flip else 0.5, movement[1])
-            else:
-                self.flip = not self.flip
-            self.walking_horizontal = max(0, self.walking_horizontal - 1)
-        elif random.random() < 0.01:  # 1% chance to change direction -> once every 100 frames (1.6 seconds)
-            self.walking_horizontal = random.randint(1, 2) * 30  # walk for 0.5 to 1 seconds
-            if self.rng < 0.5:
-                self.flip = not self.flip
+    def plan(self, tilemap, movement):
+        self.rng = self.game.rng.random()
 
-        if self.walking_vertical:
-            if tilemap.solid_check((self.rect().centerx, self.pos[1] + (-35 if movement[1] > 0 else 0))):
-                movement = (movement[0], movement[1] - 0.5 if self.flip else 0.5)
-            else:
-                movement = (movement[0], -movement[1])
-            self.walking_vertical = max(0, self.walking_vertical - 1)
-        elif random.random() < 0.01:
-            self.walking_vertical = random.randint(1, 2) * 30
+        # chase the player along the shared flow field when in range, wander around otherwise
+        step = self.game.flow_field.next_step((self.rect().centerx, self.rect().bottom - 1))
+        if step is not None:
+            movement = (movement[0] + step[0] * 0.5, movement[1] + step[1] * 0.5)
+            self.walking_horizontal = 0
+            self.walking_vertical = 0
+        else:
+            if self.walking_horizontal:
+                if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1])):
+                    movement = (movement[0] - 0.5 if self.flip else 0.5, movement[1])
+                else:
+                    self.flip = not self.flip
+                self.walking_horizontal = max(0, self.walking_horizontal - 1)
+            elif self.game.rng.random() < 0.01:  # 1% chance to change direction -> once every 100 frames (1.6 seconds)
+                self.walking_horizontal = self.game.rng.randint(1, 2) * 30  # walk for 0.5 to 1 seconds
+                if self.rng < 0.5:
+                    self.flip = not self.flip
+
+            if self.walking_vertical:
+                if tilemap.solid_check((self.rect().centerx, self.pos[1] + (-35 if movement[1] > 0 else 0))):
+                    movement = (movement[0], movement[1] - 0.5 if self.flip else 0.5)
+                else:
+                    movement = (movement[0], -movement[1])
+                self.walking_vertical = max(0, self.walking_vertical - 1)
+            elif self.game.rng.random() < 0.01:
+                self.walking_vertical = self.game.rng.randint(1, 2) * 30
 
         #movement = (0, 0)   # disable movement                                              # debug !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-        super().update(tilemap, movement=movement)
+        return movement
+
+    def after_move(self, movement):
+        super().after_move(movement)
 
         if movement[0] != 0:
             self.set_action('walk/side')
@@ -160,11 +156,13 @@ class Enemy(PhysicsEntity):
     def render(self, surf, offset=(0, 0)):
         super().render(surf, offset=offset)
 
-    def render_order(self, offset=(0, 0)):
-        return {'type': 'enemy', 'pos_adj': (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[1] + ENTITY_OFFSETS['enemy']), 'pos': (self.pos[0], self.pos[1])}
+    def render_order(self):
+        return RenderEntry('enemy', self.pos[1] + self.anim_offset[1] + ENTITY_OFFSETS['enemy'], entity=self)
 
 
 class LightEntity(PhysicsEntity):
+    __slots__ = ('walking_horizontal', 'walking_vertical', 'rng')
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'light', pos, size)
 
@@ -172,8 +170,8 @@ class LightEntity(PhysicsEntity):
         self.walking_vertical = 0
         self.rng = 0
 
-    def update(self, tilemap, movement=(0, 0)):
-        self.rng = random.random()
+    def plan(self, tilemap, movement):
+        self.rng = self.game.rng.random()
 
         if self.walking_horizontal:
             if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1])):
@@ -181,8 +179,8 @@ class LightEntity(PhysicsEntity):
             else:
                 self.flip = not self.flip
             self.walking_horizontal = max(0, self.walking_horizontal - 1)
-        elif random.random() < 0.01:  # 1% chance to change direction -> once every 100 frames (1.6 seconds)
-            self.walking_horizontal = random.randint(1, 2) * 30  # walk for 0.5 to 1 seconds
+        elif self.game.rng.random() < 0.01:  # 1% chance to change direction -> once every 100 frames (1.6 seconds)
+            self.walking_horizontal = self.game.rng.randint(1, 2) * 30  # walk for 0.5 to 1 seconds
             if self.rng < 0.5:
                 self.flip = not self.flip
 
@@ -192,11 +190,14 @@ class LightEntity(PhysicsEntity):
             else:
                 movement = (movement[0], -movement[1])
             self.walking_vertical = max(0, self.walking_vertical - 1)
-        elif random.random() < 0.01:
-            self.walking_vertical = random.randint(1, 2) * 30
+        elif self.game.rng.random() < 0.01:
+            self.walking_vertical = self.game.rng.randint(1, 2) * 30
 
         #movement = (0, 0)   # disable movement                                              # debug !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-        super().update(tilemap, movement=movement)
+        return movement
+
+    def after_move(self, movement):
+        super().after_move(movement)
 
         if movement[0] != 0:
             self.set_action('walk/side')
@@ -212,11 +213,13 @@ class LightEntity(PhysicsEntity):
             elif self.action == 'walk/side':
                 self.set_action('idle/side')
 
-    def render_order(self, offset=(0, 0)):
-        return {'type': 'light_entity', 'pos_adj': (self.pos[0] - offset[0], self.pos[1] - offset[1]+ ENTITY_OFFSETS['light_entity']), 'pos': (self.pos[0], self.pos[1])}
+    def render_order(self):
+        return RenderEntry('light_entity', self.pos[1] + ENTITY_OFFSETS['light_entity'], entity=self)
 
 
 class ShadowEyeGlowEntity(PhysicsEntity):
+    __slots__ = ('walking_horizontal', 'walking_vertical', 'rng')
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'shadow-eye-glow', pos, size)
 
@@ -224,8 +227,8 @@ class ShadowEyeGlowEntity(PhysicsEntity):
         self.walking_vertical = 0
         self.rng = 0
 
-    def update(self, tilemap, movement=(0, 0)):
-        self.rng = random.random()
+    def plan(self, tilemap, movement):
+        self.rng = self.game.rng.random()
 
         if self.walking_horizontal:
             if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1])):
@@ -233,8 +236,8 @@ class ShadowEyeGlowEntity(PhysicsEntity):
             else:
                 self.flip = not self.flip
             self.walking_horizontal = max(0, self.walking_horizontal - 1)
-        elif random.random() < 0.01:  # 1% chance to change direction -> once every 100 frames (1.6 seconds)
-            self.walking_horizontal = random.randint(1, 2) * 30  # walk for 0.5 to 1 seconds
+        elif self.game.rng.random() < 0.01:  # 1% chance to change direction -> once every 100 frames (1.6 seconds)
+            self.walking_horizontal = self.game.rng.randint(1, 2) * 30  # walk for 0.5 to 1 seconds
             if self.rng < 0.5:
                 self.flip = not self.flip
 
@@ -244,11 +247,14 @@ class ShadowEyeGlowEntity(PhysicsEntity):
             else:
                 movement = (movement[0], -movement[1])
             self.walking_vertical = max(0, self.walking_vertical - 1)
-        elif random.random() < 0.01:
-            self.walking_vertical = random.randint(1, 2) * 30
+        elif self.game.rng.random() < 0.01:
+            self.walking_vertical = self.game.rng.randint(1, 2) * 30
 
         # movement = (0, 0)   # disable movement                                              # debug !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-        super().update(tilemap, movement=movement)
+        return movement
+
+    def after_move(self, movement):
+        super().after_move(movement)
 
         if movement[0] != 0:
             self.set_action('walk/side')
@@ -264,11 +270,13 @@ class ShadowEyeGlowEntity(PhysicsEntity):
             elif self.action == 'walk/side':
                 self.set_action('idle/side')
 
-    def render_order(self, offset=(0, 0)):
-        return {'type': 'shadow_entity', 'pos_adj': (self.pos[0] - offset[0], self.pos[1] - offset[1]+ ENTITY_OFFSETS['shadow_entity']), 'pos': (self.pos[0], self.pos[1])}
+    def render_order(self):
+        return RenderEntry('shadow_entity', self.pos[1] + ENTITY_OFFSETS['shadow_entity'], entity=self)
 
 
 class Player(PhysicsEntity):
+    __slots__ = ('air_time',)
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'player', pos, size)
         self.air_time = 0
@@ -328,11 +336,11 @@ class Player(PhysicsEntity):
     def flash_rect(self, flash_pos):
         return pygame.Rect(flash_pos[0], flash_pos[1], 16, 16)  # adjust size of flash rect!!!
 
-    def render_order_flash(self, offset=(0, 0)):
-        return {'type': 'flash', 'pos_adj': (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[0])}
+    def render_order_flash(self):
+        return RenderEntry('flash', self.pos[1] + self.anim_offset[0])
 
-    def render_order(self, offset=(0, 0)):
-        return {'type': 'player', 'pos_adj': (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[0])}
+    def render_order(self):
+        return RenderEntry('player', self.pos[1] + self.anim_offset[0], entity=self)
 
     def kill(self):
         pass
@@ -367,30 +375,20 @@ class Player(PhysicsEntity):
 
 
 class Npc(PhysicsEntity):
+    __slots__ = ()
+
     def __init__(self, game, pos, size):
         super().__init__(game, 'npc', pos, size)
 
         self.set_action('idle/side')
-        self.dialogue = False
-
-    def render_proximity_text(self, player_pos, screen, render_cam_offset):
-        distance = math.sqrt((self.pos[0] - player_pos[0]) ** 2 + (self.pos[1] - player_pos[1]) ** 2)
-        font = pygame.font.SysFont('Arial', 12)
-        if distance < 30:
-            self.dialogue = True
-            text_surface = font.render('Press E', True, (255, 255, 255))
 
-            # Translate the NPC's world position into camera-relative screen position
-            text_x = self.pos[0]*4- render_cam_offset[0]*4 + 20
-            text_y = self.pos[1]*4  - render_cam_offset[1]*4  + 50  # Adjust the offset as needed
-
-            text_rect = text_surface.get_rect(center=(text_x, text_y))
-            screen.blit(text_surface, text_rect)
-        else:
-            self.dialogue = False
+    # the 'Press E' prompt shows while the player is in the trigger zone of the npc (see Game.on_trigger)
+    @staticmethod
+    def render_prompt(pos, screen, render_cam_offset):
+        render_prompt(screen, 'Press E', 12, pos, render_cam_offset, (20, 50))
 
-    def render_order(self, offset=(0, 0)):
-        return {'type': 'npc', 'pos_adj': (self.pos[0] - offset[0], self.pos[1] - offset[1]), 'pos': (self.pos[0], self.pos[1])}
+    def render_order(self):
+        return RenderEntry('npc', self.pos[1], entity=self)
 
     def render(self, surf, offset=(0, 0)):
         super().render(surf, offset=offset)
@@ -0,0 +1,117 @@
+from scripts.records import Tile
+
+MAX_ENTRIES = 500           # undo steps kept
+MAX_RECORDS = 200000        # recorded changes over all steps, the oldest steps are dropped first
+
+
+# undo / redo journal of the editor
+# records the changes the tilemap notifies as small tuples (no map snapshots), everything changed until commit is one step
+# undo applies the inverse changes through the tilemap edit methods, so grid, indexes and render caches update incrementally
+# reloading the map or autotiling the whole map can not be undone and clears the history
+class History:
+    def __init__(self, tilemap, max_entries=MAX_ENTRIES, max_records=MAX_RECORDS):
+        self.tilemap = tilemap
+        self.max_entries = max_entries
+        self.max_records = max_records
+
+        self.undo_stack = []    # steps, each a list of records
+        self.redo_stack = []
+        self.pending = []       # records of the step in progress
+        self.records = 0        # number of records in both stacks
+        self.applying = False   # ignore the changes made by undo / redo themselves
+
+        tilemap.listeners.append(self.on_change)
+
+    def clear(self):
+        self.undo_stack = []
+        self.redo_stack = []
+        self.pending = []
+        self.records = 0
+
+    # records: ('tile', loc, old, new) with (type, variant) or None, ('variant', loc, old, new), ('border', loc, added),
+    # ('offgrid', [(type, variant, x, y), ...], added)
+    def on_change(self, change):
+        if self.applying:
+            return
+        kind = change[0]
+        if kind == 'tiles':
+            for loc, old, new in change[1]:
+                self.pending.append(('tile', loc, (old.type, old.variant) if old is not None else None,
+                                     (new.type, new.variant) if new is not None else None))
+        elif kind in ('variant', 'border'):
+            self.pending.append(change)
+        elif kind == 'offgrid':
+            self.pending.append(('offgrid', [(tile.type, tile.variant, tile.pos[0], tile.pos[1]) for tile in change[1]], change[2]))
+        elif kind == 'reset':
+            self.clear()
+
+    # close the step in progress (called once per frame, a drag stroke stays open until the mouse is released)
+    def commit(self):
+        if not self.pending:
+            return
+        self.undo_stack.append(self.pending)
+        self.records += len(self.pending) - sum(len(step) for step in self.redo_stack)
+        self.pending = []
+        self.redo_stack = []
+        while self.undo_stack and (len(self.undo_stack) > self.max_entries or self.records > self.max_records):
+            self.records -= len(self.undo_stack.pop(0))
+
+    def undo(self):
+        self.commit()
+        if self.undo_stack:
+            step = self.undo_stack.pop()
+            self.apply([self.inverse(record) for record in reversed(step)])
+            self.redo_stack.append(step)
+
+    def redo(self):
+        self.commit()
+        if self.redo_stack:
+            step = self.redo_stack.pop()
+            self.apply(step)
+            self.undo_stack.append(step)
+
+    def inverse(self, record):
+        kind = record[0]
+        if kind in ('tile', 'variant'):
+            return kind, record[1], record[3], record[2]
+        return kind, record[1], not record[2]
+
+    # apply records in order, consecutive tile records go to the tilemap as one batch
+    def apply(self, records):
+        self.applying = True
+        try:
+            batch = {}
+            for record in records:
+                if record[0] == 'tile':
+                    loc, new = record[1], record[3]
+                    batch.pop(loc, None)    # keep the batch in record order
+                    batch[loc] = Tile(new[0], new[1], loc) if new is not None else None
+                    continue
+                if batch:
+                    self.tilemap.set_tiles(batch, autotile=False)
+                    batch = {}
+                if record[0] == 'variant':
+                    self.tilemap.set_variant(record[1], record[3])
+                elif record[0] == 'border':
+                    self.tilemap.set_border(record[1], record[2])
+                elif record[2]:
+                    self.tilemap.add_offgrids([Tile(t[0], t[1], (t[2], t[3])) for t in record[1]])
+                else:
+                    self.tilemap.remove_offgrids(self.find_offgrid(record[1]))
+            if batch:
+                self.tilemap.set_tiles(batch, autotile=False)
+        finally:
+            self.applying = False
+
+    # the offgrid tiles matching the recorded (type, variant, x, y) tuples
+    def find_offgrid(self, recorded):
+        candidates = {}
+        for id_pair in {(t[0], t[1]) for t in recorded}:
+            for tile in self.tilemap.offgrid_index.get(id_pair, ()):
+                candidates.setdefault((tile.type, tile.variant, tile.pos[0], tile.pos[1]), []).append(tile)
+        tiles = []
+        for key in recorded:
+            matches = candidates.get(key)
+            if matches:
+                tiles.append(matches.pop())
+        return tiles
@@ -0,0 +1,122 @@
+import pygame
+
+from data.game_text import game_text
+
+TICK_RATE = 60          # text speed is counted in ticks (same as game.TICK_RATE)
+SPLASH_TIME = 1.0       # seconds the splash is shown
+FADE_FRAME_TIME = 0.2   # seconds per image of the fade
+TEXT_SPEED = 3          # ticks per character of the typewriter
+
+
+# startup sequence: splash, fade, typewriter text, then waiting for the first level if it is still loading
+# every state is advanced once per frame, the window keeps handling events while the assets of the intro and the first level
+# are loaded in the background (intro_ready / level_ready are the futures of those loads)
+class Intro:
+    def __init__(self, game, intro_ready, level_ready):
+        self.game = game
+        self.screen = game.screen
+        self.font = game.font
+        self.intro_ready = intro_ready
+        self.level_ready = level_ready
+
+        self.state = 'splash'
+        self.state_time = 0.0   # seconds in the current state
+        self.done = False
+
+        # typewriter
+        self.display_text = game_text['intro']
+        self.active_text = 0
+        self.messages = self.display_text[self.active_text]
+        self.active_message = 0
+        self.message = self.messages[self.active_message]
+        self.text_counter = 0
+        self.line_counter = 0
+        self.text_done = False
+
+        self.screen.blit(game.assets['background2'], (0, 0))
+
+    def set_state(self, state):
+        self.state = state
+        self.state_time = 0.0
+
+    # dt: seconds since the last frame
+    def update(self, dt, events):
+        self.state_time += dt
+        if self.state == 'splash':
+            self.update_splash(events)
+        elif self.state == 'fade':
+            self.update_fade(events)
+        elif self.state == 'text':
+            self.update_text(dt * TICK_RATE, events)
+        if self.state == 'loading' and self.level_ready.done():
+            self.level_ready.result()   # raises if loading the level failed
+            self.done = True
+
+    # quit and S skip the whole intro
+    def skipped(self, events):
+        for event in events:
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_s):
+                self.set_state('loading')
+                return True
+        return False
+
+    def update_splash(self, events):
+        if self.skipped(events):
+            return
+        if self.state_time >= SPLASH_TIME and self.intro_ready.done():
+            self.intro_ready.result()
+            self.set_state('fade')
+            self.update_fade([])
+
+    def update_fade(self, events):
+        if self.skipped(events):
+            return
+        images = self.game.assets['bg_dimmed']
+        index = int(self.state_time / FADE_FRAME_TIME)
+        if index < len(images):
+            self.screen.blit(images[index], (0, 0))
+        else:
+            self.screen.blit(self.game.assets['background2_dimmed'], (0, 0))
+            self.set_state('text')
+
+    def update_text(self, ticks, events):
+        text_len = sum(map(len, self.messages))
+        if self.text_counter < TEXT_SPEED * text_len:
+            self.text_counter += ticks
+        elif self.text_counter >= TEXT_SPEED * text_len:
+            self.text_done = True
+
+        if self.line_counter < TEXT_SPEED * len(self.message):
+            self.line_counter += ticks
+        elif self.line_counter >= TEXT_SPEED * len(self.message) and not self.text_done:
+            self.line_counter = 0
+            self.active_message += 1
+            self.message = self.messages[self.active_message]
+
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.set_state('loading')
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_s:
+                    self.set_state('loading')
+                elif self.text_done and self.active_text < len(self.display_text) - 1:
+                    self.screen.blit(self.game.assets['background2_dimmed'], (0, 0))
+                    self.active_text += 1
+                    self.active_message = 0
+                    self.text_done = False
+                    self.messages = self.display_text[self.active_text]
+                    self.message = self.messages[self.active_message]
+                    self.text_counter = 0
+                    self.line_counter = 0
+                elif self.active_text == len(self.display_text) - 1:
+                    self.set_state('loading')
+
+        full_text_surface = self.font.render(self.message, True, 'white')
+        full_text_rect = full_text_surface.get_rect(center=(1280 // 2, 960 // 2))
+
+        snip = self.font.render(self.message[0:int(self.line_counter // TEXT_SPEED)], True, 'white')
+        snip_rect = snip.get_rect(center=(1280 // 2, 960 // 2 + self.active_message * 50))
+
+        # Adjust snip_rect to match the full text position
+        snip_rect.left = full_text_rect.left
+        self.screen.blit(snip, snip_rect)
@@ -0,0 +1,94 @@
+import numpy as np
+
+GROUP_ONE = 1
+GROUP_TWO = 2
+
+CACHE_SIZE = 256    # cached targets / answers per board
+BATCH_SIZE = 256    # targets per distance matrix in classify_many
+
+
+# votes for group one among the k nearest points of every row of distances (m targets x n points), of the points tied
+# with the k-th distance group one is taken first, so single and batched answers agree
+def group_one_votes(distances, labels, k):
+    kth = np.partition(distances, k - 1, axis=1)[:, k - 1:k]
+    closer = distances < kth
+    tied = distances == kth
+    group_one = labels == GROUP_ONE
+    votes = np.count_nonzero(closer & group_one, axis=1)
+    room = k - np.count_nonzero(closer, axis=1)
+    return votes + np.minimum(np.count_nonzero(tied & group_one, axis=1), room)
+
+
+# k nearest neighbors over a fixed board of labeled points (the lanterns of level 3)
+# the board is indexed once, answers for any k use partial selection and are cached until the board changes
+class KnnBoard:
+    def __init__(self, group_one=(), group_two=()):
+        self.points = np.empty((0, 2))
+        self.labels = np.empty(0, dtype=np.int8)
+        self.distance_cache = {}    # target: squared distances to all points (enough for ranking)
+        self.cache = {}             # (k, target): assigned group
+        self.set_points(group_one, group_two)
+
+    # board of the knn lanterns: decor variant 4 is the target, variant 2 group one, the rest group two
+    @classmethod
+    def from_tiles(cls, tiles):
+        target = None
+        group_one = []
+        group_two = []
+        for tile in tiles:
+            if tile.variant == 4:
+                target = tuple(tile.pos)
+            elif tile.variant == 2:
+                group_one.append(tile.pos)
+            else:
+                group_two.append(tile.pos)
+        return cls(group_one, group_two), target
+
+    def set_points(self, group_one, group_two):
+        self.points = np.array(list(group_one) + list(group_two), dtype=np.float64).reshape(-1, 2)
+        self.labels = np.array([GROUP_ONE] * len(group_one) + [GROUP_TWO] * len(group_two), dtype=np.int8)
+        self.distance_cache = {}
+        self.cache = {}
+
+    def distances(self, target):
+        target = (float(target[0]), float(target[1]))
+        if target not in self.distance_cache:
+            if len(self.distance_cache) >= CACHE_SIZE:
+                self.distance_cache.clear()
+            delta = self.points - target
+            self.distance_cache[target] = delta[:, 0] ** 2 + delta[:, 1] ** 2
+        return self.distance_cache[target]
+
+    # majority vote of the k nearest points (all of them if k is larger than the board), group two wins ties
+    def classify(self, k, target):
+        key = (k, float(target[0]), float(target[1]))
+        if key not in self.cache:
+            if len(self.cache) >= CACHE_SIZE:
+                self.cache.clear()
+            k = min(k, len(self.points))
+            if k <= 0:
+                self.cache[key] = GROUP_TWO
+            else:
+                votes = group_one_votes(self.distances(target)[np.newaxis], self.labels, k)[0]
+                self.cache[key] = GROUP_ONE if votes > k // 2 else GROUP_TWO
+        return self.cache[key]
+
+    # classify many targets at once (array of shape (m, 2)), for generated boards with thousands of points
+    def classify_many(self, k, targets):
+        targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+        k = min(k, len(self.points))
+        if k <= 0:
+            return np.full(len(targets), GROUP_TWO, dtype=np.int8)
+        groups = np.empty(len(targets), dtype=np.int8)
+        for start in range(0, len(targets), BATCH_SIZE):
+            chunk = targets[start:start + BATCH_SIZE]
+            # squared distances are enough for ranking, computed in place to keep memory at one matrix per chunk
+            distances = np.subtract.outer(chunk[:, 0], self.points[:, 0])
+            distances *= distances
+            dy = np.subtract.outer(chunk[:, 1], self.points[:, 1])
+            dy *= dy
+            distances += dy
+            votes = group_one_votes(distances, self.labels, k)
+            groups[start:start + BATCH_SIZE] = np.where(votes > k // 2, GROUP_ONE, GROUP_TWO)
+        return groups
+
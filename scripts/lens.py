@@ -0,0 +1,188 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pygame
+
+from scripts.captures import MANIFEST
+
+LIGHT = 0
+SHADOW = 1
+LABELS = {'light': LIGHT, 'shadow': SHADOW}
+MARK_COLORS = {LIGHT: (255, 236, 140), SHADOW: (150, 70, 190)}
+
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+DARK = 0.25             # luminance below which a pixel counts as dark
+EYE_SHARE = 0.1         # brightest share of the pixels taken as the eyes
+FEATURES = 21           # eye histogram (8), aura histogram (8), mean color (3), dark ratio, coverage
+
+PREDICT_BUDGET = 0.002  # seconds per frame spent on features of sprites not classified yet
+CHECK_INTERVAL = 1.0    # seconds between checks whether the dataset grew (then the lens is trained again)
+EPOCHS = 300
+LEARNING_RATE = 0.5
+L2 = 1e-3
+
+
+def surface_pixels(surface):
+    width, height = surface.get_size()
+    return np.frombuffer(pygame.image.tobytes(surface, 'RGBA'), dtype=np.uint8).reshape(height, width, 4)
+
+
+# share of the colors (n, 3 floats 0 - 1) in each of the 8 corners of the rgb cube
+def color_histogram(colors):
+    if not len(colors):
+        return np.zeros(8, dtype=np.float32)
+    corners = (colors >= 0.5).astype(np.intp) @ np.array([4, 2, 1])
+    return np.bincount(corners, minlength=8).astype(np.float32) / len(colors)
+
+
+# feature vector of a sprite (pixels: height x width x rgba), the colors of its eyes (brightest pixels) and of its aura
+# (the outline, pixels next to transparent ones), how dark and how large it is
+def sprite_features(pixels):
+    opaque = pixels[..., 3] > 0
+    if not opaque.any():
+        return np.zeros(FEATURES, dtype=np.float32)
+    rgb = pixels[..., :3].astype(np.float32) / 255
+    colors = rgb[opaque]
+    luminance = colors @ LUMA
+    eyes = colors[luminance >= np.quantile(luminance, 1 - EYE_SHARE)]
+
+    padded = np.pad(opaque, 1)
+    inside = padded[:-2, 1:-1] & padded[2:, 1:-1] & padded[1:-1, :-2] & padded[1:-1, 2:]
+    aura = rgb[opaque & ~inside]
+
+    return np.concatenate([color_histogram(eyes), color_histogram(aura), colors.mean(axis=0),
+                           [np.mean(luminance < DARK), opaque.mean()]]).astype(np.float32)
+
+
+# features of the dataset images by file, kept by the training process between trainings
+feature_cache = {}
+
+
+# features and labels of the captures in the dataset at path
+def load_dataset(path):
+    vectors = []
+    labels = []
+    with open(os.path.join(path, MANIFEST), 'r') as f:
+        for line in f:
+            record = json.loads(line)
+            if record['file'] not in feature_cache:
+                pixels = surface_pixels(pygame.image.load(os.path.join(path, record['file'])))
+                feature_cache[record['file']] = sprite_features(pixels)
+            vectors.append(feature_cache[record['file']])
+            labels.append(LABELS[record['label']])
+    return np.array(vectors, dtype=np.float32).reshape(-1, FEATURES), np.array(labels, dtype=np.float32)
+
+
+# logistic regression on the standardized features, runs in the training process
+# returns (mean, scale, weights, bias), None if the dataset doesn't have both labels yet
+def train_model(path):
+    try:
+        x, y = load_dataset(path)
+    except FileNotFoundError:
+        return None
+    if len(np.unique(y)) < 2:
+        return None
+    mean = x.mean(axis=0)
+    scale = x.std(axis=0)
+    scale[scale == 0] = 1
+    x = (x - mean) / scale
+    weights = np.zeros(FEATURES, dtype=np.float32)
+    bias = 0.0
+    for _ in range(EPOCHS):
+        error = 1 / (1 + np.exp(-(x @ weights + bias))) - y
+        weights -= LEARNING_RATE * (x.T @ error / len(y) + L2 * weights)
+        bias -= LEARNING_RATE * error.mean()
+    return mean, scale, weights, bias
+
+
+# the Lens of Insight: tells lights from shadows by their sprite, trained on the capture dataset (see CaptureWriter)
+# training runs in a separate process and starts again whenever the dataset grew, the game only classifies sprites it has
+# not seen yet, a few per frame within the time budget, one batch of predictions per frame
+class Lens:
+    def __init__(self, path, budget=PREDICT_BUDGET):
+        self.path = path
+        self.budget = budget
+        self.model = None
+        self.features = {}      # sprite surface: feature vector, cleared at level load (see clear)
+        self.labels = {}        # sprite surface: LIGHT / SHADOW by the current model
+
+        self.trainer = None
+        self.training = None
+        self.trained_size = -1  # manifest size the running or last training started from
+        self.last_check = 0.0
+        self.start_trainer()
+
+    def start_trainer(self):
+        self.trainer = ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn'))  # no fork of the game threads
+
+    def manifest_size(self):
+        try:
+            return os.path.getsize(os.path.join(self.path, MANIFEST))
+        except OSError:
+            return 0
+
+    # start a training if the dataset grew, take the model of a finished one
+    def poll(self):
+        if self.training is not None and self.training.done():
+            try:
+                model = self.training.result()
+            except Exception as e:
+                model = None
+                print('training the lens failed:', e)
+                self.trainer.shutdown(wait=False)   # the process may be gone, the next training gets a new one
+                self.start_trainer()
+            self.training = None
+            if model is not None:
+                self.model = model
+                self.labels = {}
+        now = time.perf_counter()
+        if self.training is None and now - self.last_check >= CHECK_INTERVAL:
+            self.last_check = now
+            size = self.manifest_size()
+            if size != self.trained_size:
+                self.trained_size = size
+                self.training = self.trainer.submit(train_model, self.path)
+
+    # classify the sprites of the entities (the ones on screen) that have no label yet
+    def update(self, entities):
+        self.poll()
+        if self.model is None:
+            return
+        deadline = time.perf_counter() + self.budget
+        images = []
+        for entity in entities:
+            image = entity.animation.img()
+            if image in self.labels or image in images:
+                continue
+            if image not in self.features:
+                if time.perf_counter() > deadline:
+                    continue    # next frame
+                self.features[image] = sprite_features(surface_pixels(image))
+            images.append(image)
+        if images:
+            mean, scale, weights, bias = self.model
+            scores = ((np.array([self.features[image] for image in images]) - mean) / scale) @ weights + bias
+            for image, score in zip(images, scores):
+                self.labels[image] = SHADOW if score > 0 else LIGHT
+
+    # forget the sprites of the last level, so the surfaces of asset groups the AssetManager dropped are not kept alive
+    def clear(self):
+        self.features = {}
+        self.labels = {}
+
+    def label(self, entity):
+        return self.labels.get(entity.animation.img())
+
+    def close(self):
+        self.trainer.shutdown(wait=False, cancel_futures=True)
+
+
+# dot above the entity (an EntityView) in the color of its label
+def render_mark(surf, view, label, offset):
+    x = view.pos[0] - offset[0] + view.image.get_width() // 2 - 1
+    y = view.pos[1] - offset[1] - 3
+    surf.fill(MARK_COLORS[label], (x, y, 2, 2))
@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+CHUNKED_META = 'map.json'   # chunked maps are a directory with this file (tile size, offgrid tiles, border) ...
+CHUNK_DIR = 'chunks'        # ... and one file per chunk of grid tiles in this sub directory
+
+
+# file opened for writing that replaces path only once it is complete, a crash never leaves a half written map behind
+@contextmanager
+def atomic_write(path):
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # keep the permissions of the replaced file (temp files are only readable by the owner)
+        os.chmod(temp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_json_atomic(path, data):
+    with atomic_write(path) as f:
+        json.dump(data, f)
+
+
+def chunk_file(path, chunk):
+    return os.path.join(path, CHUNK_DIR, str(chunk[0]) + '_' + str(chunk[1]) + '.json')
+
+
+# map data of a chunked map in the format of a json map (see Tilemap.load)
+def read_chunked(path):
+    with open(os.path.join(path, CHUNKED_META), 'r') as f:
+        map_data = json.load(f)
+    map_data['tilemap'] = {}
+    chunk_dir = os.path.join(path, CHUNK_DIR)
+    for name in sorted(os.listdir(chunk_dir)) if os.path.isdir(chunk_dir) else []:
+        if name.endswith('.json'):
+            with open(os.path.join(chunk_dir, name), 'r') as f:
+                map_data['tilemap'].update(json.load(f))
+    return map_data
+
+
+def tile_dict(tile_type, variant, x, y):
+    return {'type': tile_type, 'variant': variant, 'pos': [x, y]}
@@ -0,0 +1,76 @@
+from collections import deque
+
+FLOW_NEIGHBORS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+CHASE_DISTANCE = 14     # cells, enemies further away from the player keep wandering around
+EXPAND_BUDGET = 1500    # cells expanded per frame, a new field is spread over a few frames if needed
+
+
+# one breadth first search from the player's cell shared by all enemies
+# every reached cell stores the step towards its parent, so an enemy looks up its next move in O(1)
+# the field isn't patched incrementally: when the player changes cell the search starts over from the new cell, spread over
+# frames by budget (EXPAND_BUDGET cells per frame) while the enemies keep following the last finished field
+class FlowField:
+    def __init__(self, tilemap, max_distance=CHASE_DISTANCE, budget=EXPAND_BUDGET):
+        self.tilemap = tilemap
+        self.max_distance = max_distance
+        self.budget = budget
+
+        self.target = None          # cell the finished field leads to
+        self.directions = {}        # finished field, cell: (dx, dy) step towards the target
+
+        # search in progress (the finished field stays in use until it is done)
+        self.pending_target = None
+        self.frontier = deque()
+        self.distances = {}
+        self.next_directions = {}
+
+        self.rebuild()
+
+    def cell(self, pos):
+        return int(pos[0] // self.tilemap.tile_size), int(pos[1] // self.tilemap.tile_size)
+
+    # drop the field, call after the map changed
+    def rebuild(self):
+        self.target = None
+        self.directions = {}
+        self.pending_target = None
+        self.frontier.clear()
+
+    # called once per frame with the player's position, expands the search by at most budget cells
+    def update(self, pos):
+        target = self.cell(pos)
+        if self.pending_target is None and target != self.target:
+            self.pending_target = target
+            self.frontier = deque([target])
+            self.distances = {target: 0}
+            self.next_directions = {target: (0, 0)}
+
+        if self.pending_target is None:
+            return
+
+        expanded = 0
+        walkable = self.tilemap.walkable
+        while self.frontier and expanded < self.budget:
+            cell = self.frontier.popleft()
+            expanded += 1
+            distance = self.distances[cell] + 1
+            if distance > self.max_distance:
+                continue
+            for shift in FLOW_NEIGHBORS:
+                neighbor = (cell[0] + shift[0], cell[1] + shift[1])
+                if neighbor not in self.distances and walkable(neighbor):
+                    self.distances[neighbor] = distance
+                    self.next_directions[neighbor] = (-shift[0], -shift[1])
+                    self.frontier.append(neighbor)
+
+        if not self.frontier:
+            self.target = self.pending_target
+            self.directions = self.next_directions
+            self.pending_target = None
+            self.distances = {}
+            self.next_directions = {}
+
+    # step (dx, dy) towards the player from pos, None if pos is out of reach
+    def next_step(self, pos):
+        return self.directions.get(self.cell(pos))
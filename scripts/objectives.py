@@ -0,0 +1,97 @@
+# what a level asks of the player before the next one is loaded
+# the simulation emits what happens on the event bus ('capture', 'kill', 'totem_solved'), the objective of the level counts
+# those and emits 'objective_complete' once, so nothing has to be checked every tick
+
+
+class EventBus:
+    def __init__(self):
+        self.handlers = {}  # event name: [handler, ...], called with the arguments of emit
+
+    def subscribe(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def unsubscribe(self, event, handler):
+        self.handlers[event].remove(handler)
+
+    def emit(self, event, *args):
+        for handler in self.handlers.get(event, ()):
+            handler(*args)
+
+
+class Objective:
+    def __init__(self, events):
+        self.events = events
+        self.done = False
+        self.subscriptions = []
+
+    def listen(self, event, handler):
+        self.events.subscribe(event, handler)
+        self.subscriptions.append((event, handler))
+
+    def complete(self):
+        if not self.done:
+            self.done = True
+            self.events.emit('objective_complete', self)
+
+    # the level was loaded again
+    def restart(self, game):
+        self.done = False
+
+    # share (0 - 1) shown by the progress bar, None for no bar
+    def progress(self):
+        return None
+
+    # stop listening (the level is left)
+    def close(self):
+        for event, handler in self.subscriptions:
+            self.events.unsubscribe(event, handler)
+        self.subscriptions = []
+
+
+# level 1: take a picture of every light and shadow
+class CaptureObjective(Objective):
+    def __init__(self, events, game):
+        super().__init__(events)
+        self.total = 0
+        self.taken = 0
+        self.listen('capture', self.on_capture)
+        self.restart(game)
+
+    # the level was reloaded (the player died), every entity is back
+    def restart(self, game):
+        super().restart(game)
+        self.total = game.nr_light_and_shadow
+        self.taken = 0
+
+    def on_capture(self, entity, label):
+        self.taken += 1
+        if self.total and self.taken == self.total:
+            self.complete()
+
+    def progress(self):
+        return self.taken / self.total if self.total else 0
+
+
+# level 2: answer the question of every totem
+class TotemObjective(Objective):
+    def __init__(self, events, game):
+        super().__init__(events)
+        self.total = 0
+        self.solved = 0
+        self.listen('totem_solved', self.on_solved)
+        self.restart(game)
+
+    # answers stay given when the level is reloaded (see DialogueHandler.totemid_solved)
+    def restart(self, game):
+        super().restart(game)
+        self.total = len(game.totems)
+        if self.solved == self.total:
+            self.complete()
+
+    def on_solved(self, index):
+        self.solved += 1
+        if self.solved == self.total:
+            self.complete()
+
+
+LEVEL_OBJECTIVES = {0: CaptureObjective, 1: TotemObjective}    # level: objective leading to the next level
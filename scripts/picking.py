@@ -0,0 +1,84 @@
+import math
+
+import pygame
+
+BUCKET_SIZE = 64    # pixels per bucket side
+
+
+# bounding box index over the offgrid tiles for the editor (hover, selection, deletion)
+# every tile is stored in the buckets its image overlaps, queries only look at the buckets they touch
+class OffgridPicker:
+    def __init__(self, tilemap, bucket_size=BUCKET_SIZE):
+        self.tilemap = tilemap
+        self.image = tilemap.registry.image
+        self.bucket_size = bucket_size
+
+        self.buckets = {}   # (bx, by): tiles
+        self.order = {}     # id(tile): placement number, later tiles are drawn on top
+        self.counter = 0
+
+        self.reset()
+        tilemap.listeners.append(self.on_change)
+
+    def reset(self):
+        self.buckets = {}
+        self.order = {}
+        self.counter = 0
+        self.add(self.tilemap.offgrid_tiles)
+
+    def rect(self, tile):
+        img = self.image(tile.type, tile.variant)
+        return pygame.Rect(math.floor(tile.pos[0]), math.floor(tile.pos[1]), img.get_width(), img.get_height())
+
+    def rect_buckets(self, rect):
+        return [(x, y) for x in range(rect.left // self.bucket_size, (rect.right - 1) // self.bucket_size + 1)
+                for y in range(rect.top // self.bucket_size, (rect.bottom - 1) // self.bucket_size + 1)]
+
+    def add(self, tiles):
+        for tile in tiles:
+            self.order[id(tile)] = self.counter
+            self.counter += 1
+            for bucket in self.rect_buckets(self.rect(tile)):
+                self.buckets.setdefault(bucket, []).append(tile)
+
+    def remove(self, tiles):
+        removed = {id(tile) for tile in tiles}
+        buckets = set()
+        for tile in tiles:
+            buckets.update(self.rect_buckets(self.rect(tile)))
+            self.order.pop(id(tile), None)
+        for bucket in buckets:
+            remaining = [tile for tile in self.buckets.get(bucket, ()) if id(tile) not in removed]
+            if remaining:
+                self.buckets[bucket] = remaining
+            else:
+                self.buckets.pop(bucket, None)
+
+    # listener of Tilemap.notify
+    def on_change(self, change):
+        if change[0] == 'offgrid':
+            if change[2]:
+                self.add(change[1])
+            else:
+                self.remove(change[1])
+        elif change[0] == 'reset':
+            self.reset()
+
+    # tiles whose image overlaps rect (pixels), in placement order
+    def in_rect(self, rect):
+        found = {}
+        for bucket in self.rect_buckets(rect):
+            for tile in self.buckets.get(bucket, ()):
+                if id(tile) not in found and self.rect(tile).colliderect(rect):
+                    found[id(tile)] = tile
+        return sorted(found.values(), key=lambda tile: self.order[id(tile)])
+
+    # tiles whose image contains pos (pixels), in placement order (the last one is on top)
+    def at(self, pos):
+        bucket = (int(pos[0] // self.bucket_size), int(pos[1] // self.bucket_size))
+        tiles = [tile for tile in self.buckets.get(bucket, ()) if self.rect(tile).collidepoint(pos)]
+        return sorted(tiles, key=lambda tile: self.order[id(tile)])
+
+    def top(self, pos):
+        tiles = self.at(pos)
+        return tiles[-1] if tiles else None
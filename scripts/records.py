@@ -0,0 +1,46 @@
+# compact record types used by the tilemap, the entities and the render list
+# __slots__ drops the per-instance __dict__ (less memory, faster attribute access)
+
+
+class Tile:
+    __slots__ = ('type', 'variant', 'pos')
+
+    def __init__(self, type, variant, pos):
+        self.type = type
+        self.variant = variant
+        self.pos = list(pos)    # always a list so position comparisons work for tiles placed in the editor too
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['type'], data['variant'], data['pos'])
+
+    # json representation (same format as the map files)
+    def to_dict(self):
+        return {'type': self.type, 'variant': self.variant, 'pos': list(self.pos)}
+
+    def copy(self):
+        return Tile(self.type, self.variant, self.pos)
+
+    def __repr__(self):
+        return f'Tile({self.type!r}, {self.variant!r}, {self.pos!r})'
+
+
+class RenderEntry:
+    # depth is the world space y used for sorting front and back objects
+    # entity is set for entities (rendered by themselves), None for offgrid tiles
+    __slots__ = ('type', 'variant', 'pos', 'depth', 'entity')
+
+    def __init__(self, type, depth, pos=None, variant=None, entity=None):
+        self.type = type
+        self.variant = variant
+        self.pos = pos
+        self.depth = depth
+        self.entity = entity
+
+
+class Totem:
+    __slots__ = ('pos', 'index')
+
+    def __init__(self, pos, index):
+        self.pos = pos
+        self.index = index
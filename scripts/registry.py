@@ -0,0 +1,191 @@
+# tile metadata: the hand written tables below are compiled into flat arrays indexed by a tile id (see TileRegistry)
+
+TILE_TYPES = ('decor', 'grass', 'ground_decor', 'spawners', 'stone', 'tree', 'water')   # asset groups that are tiles
+
+PHYSICS_TILES = {
+                 'stone': {0: (16, 1, 0),   # variant: (width, height, vertical_offset)
+                           1: (16, 1, 0),   # set as we don't put keys (set is more efficient for lookup than list)
+                           2: (16, 1, 0),
+                           3: (16, 0, 0),
+                           4: (16, 0, 0),
+                           5: (16, 1, 0),
+                           6: (16, 1, 0),
+                           7: (16, 1, 0),
+                           8: (16, 0, 0),
+                           9: (16, 0, 0),
+                           10: (48, 18, 0),
+                           11: (32, 12, 0),
+                           12: (32, 12, 0),
+                           13: (32, 14, 0),
+                           14: (32, 14, 0),
+                           },       # done
+                 'decor': {0: (16, 8, 24),
+                           1: (16, 8, 24),
+                           2: (16, 8, 24),
+                           3: (16, 8, 24),
+                           4: (16, 8, 24),
+                           },
+                 'water': {0: (16, 8, 0),   # variant: (width, height, vertical_offset)
+                           1: (16, 8, 0),
+                           2: (16, 8, 0),
+                           3: (16, 8, 0),
+                           4: (16, 8, 0),
+                           5: (16, 8, 0),
+                           6: (16, 8, 0),
+                           7: (16, 8, 0),
+                           8: (16, 8, 0),
+                           9: (16, 8, 0),
+                           10: (16, 8, 0),
+                           11: (16, 8, 0),
+                           12: (16, 8, 0),
+                           },       # done
+                 }
+
+FRONT_BACK_OFFSET = {
+                    'decor':  {0: 18,  # almost done
+                                1: 68,
+                                2: -8,  # to be modified
+                                3: -3,  # knn thingy
+                                4: -8,  # knn thingy
+                                },      # almost done
+                    'spawners':   {0: 8,   # player
+                                    1: 8,   # light entity
+                                    2: 8,   # npc
+                                    3: 60,  # enemy
+                                    4: 8,   # shadow entity
+                                    },       # irrelevant
+                    'stone':  {    # done
+                         0: -8,
+                         1: -8,
+                         2: -8,
+                         3: -12,
+                         4: -20,
+                         5: -8,
+                         6: -8,
+                         7: -8,
+                         8: -20,
+                         9: -20,
+                         10: -8,
+                         11: -8,
+                         12: -8,
+                         13: -8,
+                         14: -8,
+                         },           # done
+                    'ground_decor': {  # done
+                        0: -8,
+                        1: -8,
+                        2: -10,
+                        3: -9,
+                        4: -30,
+                        5: -30,
+                        6: -30,
+                        7: -30,
+                        8: -30,
+                        9: -30,
+                        10: -30,
+                     },     # done
+                    'tree': {  # done
+                         0: 62,
+                         1: 62,
+                         2: 62,
+                         3: 62,
+                         4: 62,
+                         5: 62,
+                         6: 62,
+                         7: 62,
+                     },             # done
+                    'grass': {  # done
+                         0: -30,
+                         1: -30,
+                         2: -30,
+                         3: -30,
+                         4: -30,
+                         5: -30,
+                         6: -30,
+                         7: -30,
+                         8: -30,
+                         9: -30,
+                        10: -30,
+                        11: -30,
+                        12: -30,
+                        13: -30,
+                        14: -30,
+                        15: -30,
+                        16: -30,
+                        17: -30,
+                        18: -30,
+                        19: -30,
+                        20: -30,
+                        21: -30,
+                        22: -30,
+                        23: -30,
+                        24: -30,
+                        25: -30,
+                        26: -30,
+                        27: -30,
+                        28: -30,
+                        29: -30,
+                        30: -30,
+                        31: -30,
+                        32: -30,
+                        33: -30,
+                        34: -30,
+                        35: -30,
+                        36: -30,
+                        37: -30,
+                        38: -30,
+                     },            # done
+                    }  # offsets for rendering front and back objects (has to be set manually)
+
+
+# tile ids: the variants of a type are numbered consecutively, id = first_ids[type_id] + variant
+# every table is a flat list indexed by the id, so the per tile lookups of the hot paths are one index instead of nested dicts
+# unknown (type, variant) pairs are reported when a map is loaded (validate) instead of failing with a KeyError mid-render
+class TileRegistry:
+    def __init__(self, assets, types=TILE_TYPES):
+        self.type_ids = {}          # type: type id
+        self.first_ids = []         # type id: tile id of variant 0
+        self.variant_counts = []    # type id: number of variants (images)
+        self.ids = {}               # (type, variant): tile id
+        self.keys = []              # tile id: (type, variant)
+
+        self.images = []            # tile id: image
+        self.solid = bytearray()    # tile id: 1 if the tile collides (grid tiles of these types block their cell)
+        self.physics = []           # tile id: (width, height, vertical_offset) of the physics rect, None if it doesn't collide
+        self.depth_offsets = []     # tile id: offset of the render depth (see FRONT_BACK_OFFSET)
+
+        for tile_type in types:
+            self.type_ids[tile_type] = len(self.first_ids)
+            self.first_ids.append(len(self.keys))
+            self.variant_counts.append(len(assets[tile_type]))
+            for variant, image in enumerate(assets[tile_type]):
+                self.ids[(tile_type, variant)] = len(self.keys)
+                self.keys.append((tile_type, variant))
+                self.images.append(image)
+                if tile_type in PHYSICS_TILES:
+                    if variant not in PHYSICS_TILES[tile_type]:
+                        raise ValueError(f'PHYSICS_TILES has no rect for {tile_type} variant {variant}')
+                    self.solid.append(1)
+                    self.physics.append(PHYSICS_TILES[tile_type][variant])
+                else:
+                    self.solid.append(0)
+                    self.physics.append(None)
+                self.depth_offsets.append(FRONT_BACK_OFFSET.get(tile_type, {}).get(variant, 0))  # types without offset sort by position
+
+    def tile_id(self, tile_type, variant):
+        return self.ids[(tile_type, variant)]
+
+    def image(self, tile_type, variant):
+        return self.images[self.ids[(tile_type, variant)]]
+
+    # cells a physics rect can extend right / down of the cell it is anchored on
+    def reach(self, tile_size):
+        rects = [rect for rect in self.physics if rect is not None]
+        return (max([(width - 1) // tile_size for width, height, vertical_offset in rects], default=0),
+                max([(vertical_offset + height - 1) // tile_size for width, height, vertical_offset in rects], default=0))
+
+    # raise a ValueError naming every (type, variant) of tiles that is not registered
+    def validate(self, tiles, source='map'):
+        unknown = sorted({(tile.type, tile.variant) for tile in tiles if (tile.type, tile.variant) not in self.ids}, key=str)
+        if unknown:
+            raise ValueError(f'{source} uses unknown tiles (type, variant): ' + ', '.join(map(str, unknown)))
@@ -0,0 +1,73 @@
+import struct
+import pygame
+
+# replay file layout (little endian):
+#   header: magic, version, rng seed (signed, any seed game.py --seed takes in 64 bits), start level
+#   records: frame (simulation tick), event code, value (key or mouse button), one per logged event
+#   a final END record holds the number of recorded ticks
+# version 2: the events of a tick are handled before it is simulated (fixed timestep loop)
+REPLAY_MAGIC = b'SGRP'
+REPLAY_VERSION = 2
+HEADER = struct.Struct('<4sBqB')
+RECORD = struct.Struct('<IBI')
+
+END = 255
+
+# event code: (pygame event type, attribute holding the value)
+EVENT_CODES = {
+    0: (pygame.QUIT, None),
+    1: (pygame.KEYDOWN, 'key'),
+    2: (pygame.KEYUP, 'key'),
+    3: (pygame.MOUSEBUTTONDOWN, 'button'),
+    4: (pygame.MOUSEBUTTONUP, 'button'),
+}
+EVENT_TYPES = {event_type: (code, attr) for code, (event_type, attr) in EVENT_CODES.items()}
+
+
+class ReplayRecorder:
+    def __init__(self, path, seed, level=0):
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, seed, level))
+        self.frames = 0
+
+    # log the events the game reacts to, everything else (mouse motion, window events, ...) is dropped
+    def record(self, frame, events):
+        for event in events:
+            if event.type in EVENT_TYPES:
+                code, attr = EVENT_TYPES[event.type]
+                self.file.write(RECORD.pack(frame, code, getattr(event, attr) if attr else 0))
+        self.frames = frame + 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.write(RECORD.pack(self.frames, END, 0))
+            self.file.close()
+
+
+class ReplayPlayer:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        magic, version, self.seed, self.level = HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f'{path} is not a replay file (version {REPLAY_VERSION})')
+
+        self.events = {}    # frame: list of events
+        self.frames = None
+        for frame, code, value in RECORD.iter_unpack(data[HEADER.size:]):
+            if code == END:
+                self.frames = frame
+                break
+            event_type, attr = EVENT_CODES[code]
+            self.events.setdefault(frame, []).append(pygame.event.Event(event_type, {attr: value} if attr else {}))
+
+        # recording was interrupted before close, play until the last logged event
+        if self.frames is None:
+            self.frames = max(self.events, default=-1) + 1
+
+    def done(self, frame):
+        return frame >= self.frames
+
+    def get(self, frame):
+        return self.events.get(frame, [])
@@ -0,0 +1,143 @@
+import os
+import queue
+import threading
+import time
+
+from scripts.chunks import CHUNK_SIZE
+from scripts.mapfile import CHUNKED_META, CHUNK_DIR, write_json_atomic, chunk_file, tile_dict
+
+AUTOSAVE_INTERVAL = 60      # seconds between autosaves (only if something changed)
+
+
+# saves the map in the background: the editor only takes a snapshot (tuples of the tile fields), a worker thread
+# serializes and writes it atomically
+# a path without .json uses the chunked format, then only the chunks edited since the last save are rewritten
+class MapSaver:
+    def __init__(self, tilemap, path, chunk_size=CHUNK_SIZE, interval=AUTOSAVE_INTERVAL):
+        self.tilemap = tilemap
+        self.path = path
+        self.chunked = not path.endswith('.json')
+        self.chunk_size = chunk_size
+        self.interval = interval
+
+        self.changed = False            # edits since the last save
+        self.dirty_chunks = set()
+        self.meta_dirty = True
+        self.full = True                # rewrite every chunk (first save, map reloaded, failed save)
+        self.last_save = time.perf_counter()
+
+        self.error = None
+        self.jobs = queue.Queue()
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+        tilemap.listeners.append(self.on_change)
+
+    def chunk(self, loc):
+        return loc[0] // self.chunk_size, loc[1] // self.chunk_size
+
+    # listener of Tilemap.notify
+    def on_change(self, change):
+        self.changed = True
+        kind = change[0]
+        if kind == 'tiles':
+            for loc, old, new in change[1]:
+                self.dirty_chunks.add(self.chunk(loc))
+        elif kind == 'variant':
+            self.dirty_chunks.add(self.chunk(change[1]))
+        elif kind in ('border', 'offgrid'):
+            self.meta_dirty = True
+        elif kind == 'reset':
+            self.full = True
+            self.meta_dirty = True
+
+    def snapshot_meta(self):
+        return {'tile_size': self.tilemap.tile_size,
+                'offgrid': [(tile.type, tile.variant, tile.pos[0], tile.pos[1]) for tile in self.tilemap.offgrid_tiles],
+                'border': sorted(self.tilemap.border)}
+
+    # grid tiles of the chunks as tuples, chunk: [(loc, type, variant, x, y), ...]
+    def snapshot_chunks(self, chunks):
+        snapshot = {chunk: [] for chunk in chunks}
+        if self.full:
+            for loc, tile in self.tilemap.tilemap.items():
+                snapshot.setdefault(self.chunk(tile.pos), []).append((loc, tile.type, tile.variant, tile.pos[0], tile.pos[1]))
+            return snapshot
+        for chunk in chunks:
+            for x in range(chunk[0] * self.chunk_size, (chunk[0] + 1) * self.chunk_size):
+                for y in range(chunk[1] * self.chunk_size, (chunk[1] + 1) * self.chunk_size):
+                    loc = str(x) + ';' + str(y)
+                    tile = self.tilemap.tilemap.get(loc)
+                    if tile is not None:
+                        snapshot[chunk].append((loc, tile.type, tile.variant, tile.pos[0], tile.pos[1]))
+        return snapshot
+
+    # snapshot the map and hand it to the worker thread
+    def save(self):
+        if self.chunked:
+            job = {'meta': self.snapshot_meta() if self.meta_dirty or self.full else None,
+                   'chunks': self.snapshot_chunks(self.dirty_chunks), 'full': self.full}
+        else:
+            job = {'meta': self.snapshot_meta(), 'grid': [(loc, tile.type, tile.variant, tile.pos[0], tile.pos[1])
+                                                          for loc, tile in self.tilemap.tilemap.items()]}
+        self.dirty_chunks = set()
+        self.meta_dirty = False
+        self.full = False
+        self.changed = False
+        self.last_save = time.perf_counter()
+        self.jobs.put(job)
+
+    # call once per frame, saves every interval seconds if the map was edited
+    def autosave(self):
+        if self.changed and time.perf_counter() - self.last_save >= self.interval and self.jobs.empty():
+            self.save()
+
+    # wait for the pending saves and stop the worker
+    def close(self):
+        self.jobs.put(None)
+        self.worker.join()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            try:
+                if self.chunked:
+                    self.write_chunked(job)
+                else:
+                    self.write_json(job)
+            except Exception as e:
+                self.error = e
+                self.full = True    # nothing is known to be on disk, rewrite everything next time
+                self.changed = True
+                print('saving', self.path, 'failed:', e)
+
+    def meta_data(self, meta):
+        return {'tile_size': meta['tile_size'], 'offgrid': [tile_dict(*tile) for tile in meta['offgrid']],
+                'border': [list(loc) for loc in meta['border']]}
+
+    def write_json(self, job):
+        map_data = self.meta_data(job['meta'])
+        map_data['tilemap'] = {loc: tile_dict(tile_type, variant, x, y) for loc, tile_type, variant, x, y in job['grid']}
+        write_json_atomic(self.path, map_data)
+
+    def write_chunked(self, job):
+        os.makedirs(os.path.join(self.path, CHUNK_DIR), exist_ok=True)
+        written = set()
+        for chunk, tiles in job['chunks'].items():
+            path = chunk_file(self.path, chunk)
+            if tiles:
+                write_json_atomic(path, {loc: tile_dict(tile_type, variant, x, y) for loc, tile_type, variant, x, y in tiles})
+                written.add(os.path.basename(path))
+            elif os.path.exists(path):
+                os.remove(path)
+        if job['full']:
+            # chunks that are empty now
+            for name in os.listdir(os.path.join(self.path, CHUNK_DIR)):
+                if name.endswith('.json') and name not in written:
+                    os.remove(os.path.join(self.path, CHUNK_DIR, name))
+        if job['meta'] is not None:
+            map_data = self.meta_data(job['meta'])
+            map_data['chunk_size'] = self.chunk_size
+            write_json_atomic(os.path.join(self.path, CHUNKED_META), map_data)
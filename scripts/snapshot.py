@@ -0,0 +1,75 @@
+import pygame
+
+
+# immutable copies of the simulation state that drawing needs, taken after the last tick of a frame
+# the renderer only reads these (and the tilemap), so it can draw while the simulation thread already runs the next ticks
+
+
+# has the fields the render and position methods of the entities read (Player.flash_pos works on a view)
+class EntityView:
+    __slots__ = ('image', 'action', 'flip', 'pos', 'prev_pos', 'anim_offset')
+
+    def __init__(self, entity):
+        self.image = entity.animation.img()
+        self.action = entity.action
+        self.flip = entity.flip
+        self.pos = tuple(entity.pos)
+        self.prev_pos = tuple(entity.prev_pos)
+        self.anim_offset = entity.anim_offset
+
+    # same as PhysicsEntity.lerp_offset
+    def lerp_offset(self, offset, alpha):
+        return (offset[0] + (self.pos[0] - self.prev_pos[0]) * (1 - alpha), offset[1] + (self.pos[1] - self.prev_pos[1]) * (1 - alpha))
+
+    # same as PhysicsEntity.render
+    def render(self, surf, offset=(0, 0)):
+        surf.blit(pygame.transform.flip(self.image, self.flip, False),
+                  (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[0]))
+
+
+# render entry of an entity with a view instead of the live entity
+def entity_entry(entity):
+    entry = entity.render_order()
+    entry.entity = EntityView(entity)
+    return entry
+
+
+class WorldSnapshot:
+    __slots__ = ('tick', 'level', 'level_loads', 'paused', 'cam', 'prev_cam', 'player', 'entries', 'flash',
+                 'lens_marks', 'progress', 'npc_prompts', 'totem_prompts')
+
+    def __init__(self, game):
+        self.tick = game.frame
+        self.level = game.level
+        self.level_loads = game.level_loads     # the tilemap the snapshot belongs to
+        self.paused = game.dialogue_handler.dialogue_active or game.codex.codex_active
+        self.cam = tuple(game.cam)
+        self.prev_cam = tuple(game.prev_cam)
+
+        player = game.player
+        self.player = EntityView(player)
+        self.entries = []   # render entries of the entities (and the flash), merged with the offgrid tiles when drawing
+        if game.dead_timer == 0:    # don't render player when dead
+            self.entries.append(entity_entry(player))
+        self.lens_marks = []    # (view, label) of the entities the lens classified
+        for entity in game.enemies + game.light_entities + game.shadow_eye_glow + game.npcs:
+            entry = entity_entry(entity)
+            self.entries.append(entry)
+            label = game.lens.label(entity) if game.lens else None
+            if label is not None:
+                self.lens_marks.append((entry.entity, label))
+
+        self.flash = game.flash
+        if game.flash:
+            self.entries.append(player.render_order_flash())
+
+        self.progress = game.objective.progress() if game.objective else None   # progress bar (level 1)
+
+        # prompts next to the npcs and totems the player is close to
+        self.npc_prompts = [tuple(npc.pos) for npc in game.near_npcs]
+        self.totem_prompts = [tuple(totem.pos) for totem in game.near_totems]
+
+    # camera alpha (0 - 1) of the way from the previous to the current tick
+    def render_cam(self, alpha):
+        return (int(self.prev_cam[0] + (self.cam[0] - self.prev_cam[0]) * alpha),
+                int(self.prev_cam[1] + (self.cam[1] - self.prev_cam[1]) * alpha))
@@ -1,5 +1,11 @@
+import os
 import pygame
 import json
+from array import array
+
+from scripts.records import Tile, RenderEntry, Totem
+from scripts.registry import TileRegistry
+from scripts.mapfile import write_json_atomic, read_chunked
 
 # mapping of tiles depending on their neighbor
 # tuple of sorted list so the order doesn't matter but need tuple as lists don't work as keys
@@ -17,148 +23,15 @@ AUTOTILE_MAP = {
 
 PROGRESSBAR_POS = (0, 0)    # position of progressbar
 
-NEIGHBOR_OFFSETS = [(1, -1), (1, 0), (1, 1),
-                    (0, -1), (0, 0), (0, 1),
-                    (-1, -1), (-1, 0), (-1, 1),
-                    (2, 0), (0, 2), (-2, 0),
-                    (1, 2), (-1, 2)]    # offsets of neighbors for big enemy
-
-PHYSICS_TILES = {
-                 'stone': {0: (16, 1, 0),   # variant: (width, height, vertical_offset)
-                           1: (16, 1, 0),   # set as we don't put keys (set is more efficient for lookup than list)
-                           2: (16, 1, 0),
-                           3: (16, 0, 0),
-                           4: (16, 0, 0),
-                           5: (16, 1, 0),
-                           6: (16, 1, 0),
-                           7: (16, 1, 0),
-                           8: (16, 0, 0),
-                           9: (16, 0, 0),
-                           10: (48, 18, 0),
-                           11: (32, 12, 0),
-                           12: (32, 12, 0),
-                           13: (32, 14, 0),
-                           14: (32, 14, 0),
-                           },       # done
-                 'decor': {0: (16, 8, 24),
-                           1: (16, 8, 24),
-                           2: (16, 8, 24),
-                           3: (16, 8, 24),
-                           4: (16, 8, 24),
-                           },
-                 'water': {0: (16, 8, 0),   # variant: (width, height, vertical_offset)
-                           1: (16, 8, 0),
-                           2: (16, 8, 0),
-                           3: (16, 8, 0),
-                           4: (16, 8, 0),
-                           5: (16, 8, 0),
-                           6: (16, 8, 0),
-                           7: (16, 8, 0),
-                           8: (16, 8, 0),
-                           9: (16, 8, 0),
-                           10: (16, 8, 0),
-                           11: (16, 8, 0),
-                           12: (16, 8, 0),
-                           },       # done
-                 }
-AUTOTILE_TYPES = {}     # {'grass', 'stone'} # types of tiles that should be autotiled
-FRONT_BACK_OFFSET = {
-                    'decor':  {0: 18,  # almost done
-                                1: 68,
-                                2: -8,  # to be modified
-                                3: -3,  # knn thingy
-                                4: -8,  # knn thingy
-                                },      # almost done
-                    'spawners':   {0: 8,   # player
-                                    1: 8,   # light entity
-                                    2: 8,   # npc
-                                    3: 60,  # enemy
-                                    4: 8,   # shadow entity
-                                    },       # irrelevant
-                    'stone':  {    # done
-                         0: -8,
-                         1: -8,
-                         2: -8,
-                         3: -12,
-                         4: -20,
-                         5: -8,
-                         6: -8,
-                         7: -8,
-                         8: -20,
-                         9: -20,
-                         10: -8,
-                         11: -8,
-                         12: -8,
-                         13: -8,
-                         14: -8,
-                         },           # done
-                    'ground_decor': {  # done
-                        0: -8,
-                        1: -8,
-                        2: -10,
-                        3: -9,
-                        4: -30,
-                        5: -30,
-                        6: -30,
-                        7: -30,
-                        8: -30,
-                        9: -30,
-                        10: -30,
-                     },     # done
-                    'tree': {  # done
-                         0: 62,
-                         1: 62,
-                         2: 62,
-                         3: 62,
-                         4: 62,
-                         5: 62,
-                         6: 62,
-                         7: 62,
-                     },             # done
-                    'grass': {  # done
-                         0: -30,
-                         1: -30,
-                         2: -30,
-                         3: -30,
-                         4: -30,
-                         5: -30,
-                         6: -30,
-                         7: -30,
-                         8: -30,
-                         9: -30,
-                        10: -30,
-                        11: -30,
-                        12: -30,
-                        13: -30,
-                        14: -30,
-                        15: -30,
-                        16: -30,
-                        17: -30,
-                        18: -30,
-                        19: -30,
-                        20: -30,
-                        21: -30,
-                        22: -30,
-                        23: -30,
-                        24: -30,
-                        25: -30,
-                        26: -30,
-                        27: -30,
-                        28: -30,
-                        29: -30,
-                        30: -30,
-                        31: -30,
-                        32: -30,
-                        33: -30,
-                        34: -30,
-                        35: -30,
-                        36: -30,
-                        37: -30,
-                        38: -30,
-                     },            # done
-                    }  # offsets for rendering front and back objects (has to be set manually)
+# flags of the compiled cell grid
+CELL_GROUND = 1     # a grid tile is placed on the cell
+CELL_SOLID = 2      # cell is blocked (physics grid tile, border or obstacle)
+CELL_OBSTACLE = 4   # cell is covered by the physics rect of an offgrid tile
+GRID_MARGIN = 8     # free cells around the map, edits close to the edge don't reallocate the grid
 
+AUTOTILE_SHIFTS = [(1, 0), (-1, 0), (0, 1), (0, -1)]  # neighbors looked at by autotile
 
+AUTOTILE_TYPES = {}     # {'grass', 'stone'} # types of tiles that should be autotiled
 class Tilemap:
     def __init__(self, game, tile_size=16):
         self.game = game
@@ -166,104 +39,368 @@ class Tilemap:
         self.tilemap = {}
         self.offgrid_tiles = []
 
-        self.border = []    # define border of the map
+        self.border = set()     # define border of the map, (x, y) cells
         self.border_tiles = []
 
-    # find all tiles of (type, variant) specified in id_pairs
+        self.render_entries = []    # cached render list entries of the offgrid tiles (rebuilt when offgrid tiles change)
+        self.offgrid_index = {}     # (type, variant): offgrid tiles in placement order
+
+        # dense grid of CELL_* flags compiled from tilemap, offgrid tiles and border (kept up to date by the edit methods)
+        self.grid_x = 0
+        self.grid_y = 0
+        self.grid_width = 0
+        self.grid_height = 0
+        self.cell_flags = bytearray()
+        self.cell_ids = array('i')  # tile id (see TileRegistry) of the grid tile of each cell, -1 if there is none
+        self.obstacles = {}     # cell: number of offgrid tiles covering it
+
+        self.registry = TileRegistry(game.assets)   # images, physics rects and depth offsets of the tiles
+
+        self.listeners = []     # callables notified about every edit (render caches, editor tools), see notify
+
+    # tell the listeners about a change of the map, one of
+    # ('tiles', [(loc, old, new), ...]), ('variant', loc, old, new), ('border', loc, added), ('offgrid', tiles, added), ('reset',)
+    def notify(self, *change):
+        for listener in self.listeners:
+            listener(change)
+
+    # find all tiles of (type, variant) specified in id_pairs, positions of the matches are in pixels
+    # removes them from the map unless keep is set (one pass over the tiles, collections are rebuilt once)
     def extract(self, id_pairs, keep=False):
+        id_pairs = set(id_pairs)
         matches = []
-        for tile in self.offgrid_tiles.copy():
-            if (tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
-                if not keep:
-                    self.offgrid_tiles.remove(tile)
 
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            if (tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
-                matches[-1]['pos'] = matches[-1]['pos'].copy()
-                matches[-1]['pos'][0] *= self.tile_size
-                matches[-1]['pos'][1] *= self.tile_size
-                if not keep:
-                    del self.tilemap[loc]
+        # offgrid tiles, the index tells if there is anything to extract at all
+        if any(self.offgrid_index.get(id_pair) for id_pair in id_pairs):
+            remaining = []
+            removed = []
+            for tile in self.offgrid_tiles:
+                if (tile.type, tile.variant) in id_pairs:
+                    matches.append(tile.copy())
+                    removed.append(tile)
+                else:
+                    remaining.append(tile)
+
+            if not keep:
+                self.offgrid_tiles = remaining
+                for id_pair in id_pairs:
+                    self.offgrid_index.pop(id_pair, None)
+                self.rebuild_render_entries()
+                changed_cells = set()
+                for tile in removed:
+                    changed_cells.update(self.remove_obstacle(tile))
+                for cell in changed_cells:
+                    self.refresh_cell(cell)
+
+        # grid tiles
+        removed_locs = []
+        for loc, tile in self.tilemap.items():
+            if (tile.type, tile.variant) in id_pairs:
+                match = tile.copy()
+                match.pos[0] *= self.tile_size
+                match.pos[1] *= self.tile_size
+                matches.append(match)
+                removed_locs.append(loc)
+
+        if not keep:
+            for loc in removed_locs:
+                tile = self.tilemap.pop(loc)
+                self.refresh_cell((tile.pos[0], tile.pos[1]))
+            if matches:
+                self.notify('reset')
 
         return matches
 
-    # get tiles that are currently around the player (big for optimization)
-    def tiles_around(self, pos):
-        tiles = []
-        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
-        for offset in NEIGHBOR_OFFSETS:
-            check_loc_int = [tile_loc[0] + offset[0],tile_loc[1] + offset[1]]
-            check_loc_int_offgrid = [check_loc_int[0]*self.tile_size, check_loc_int[1]*self.tile_size]
-            check_loc_str = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])
-            if check_loc_str in self.tilemap:
-                tiles.append(self.tilemap[check_loc_str])
-            for tile in self.offgrid_tiles:
-                if tile['pos'] == check_loc_int_offgrid:
-                    tiles.append({'type': tile['type'], 'pos': check_loc_int, 'variant': tile['variant']})
-            if check_loc_int in self.border:
-                tiles.append({'type': 'border element place holder', 'pos': check_loc_int})
-        return tiles
-
-    # save the tilemap to json
+    # save the tilemap to json (written to a temp file first, see MapSaver for saving in the background)
     def save(self, path):
-        with open(path, 'w') as f:
-            json.dump({'tilemap': self.tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles, 'border': self.border}, f)
+        write_json_atomic(path, {'tilemap': {loc: tile.to_dict() for loc, tile in self.tilemap.items()}, 'tile_size': self.tile_size,
+                                 'offgrid': [tile.to_dict() for tile in self.offgrid_tiles], 'border': [list(loc) for loc in sorted(self.border)]})
 
-    # load tilemap from json
+    # load tilemap from json or from a chunked map directory
     def load(self, path):
-        with open(path, 'r') as f:
-            map_data = json.load(f)
+        if os.path.isdir(path):
+            map_data = read_chunked(path)
+        else:
+            with open(path, 'r') as f:
+                map_data = json.load(f)
+
+        tilemap = {loc: Tile.from_dict(tile) for loc, tile in map_data['tilemap'].items()}
+        offgrid_tiles = [Tile.from_dict(tile) for tile in map_data['offgrid']]
+        self.registry.validate(list(tilemap.values()) + offgrid_tiles, source=path)    # the current map stays loaded
 
-        self.tilemap = map_data['tilemap']
+        self.tilemap = tilemap
         self.tile_size = map_data['tile_size']
-        self.offgrid_tiles = map_data['offgrid']
-        self.border = map_data['border']
+        self.offgrid_tiles = offgrid_tiles
+        self.border = {(loc[0], loc[1]) for loc in map_data['border']}     # older maps store duplicates
+        self.rebuild_render_entries()
+        self.rebuild_offgrid_index()
+        self.compile_grid()
+        self.notify('reset')
+
+    def rebuild_offgrid_index(self):
+        self.offgrid_index = {}
+        for tile in self.offgrid_tiles:
+            self.offgrid_index.setdefault((tile.type, tile.variant), []).append(tile)
 
-    def solid_check(self, pos):
-        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
-        if tile_loc in self.tilemap:
-            return self.tilemap[tile_loc]
+    # offgrid tiles of the given (type, variant) pairs, without scanning all offgrid tiles
+    def tiles_of(self, *id_pairs):
+        tiles = []
+        for id_pair in id_pairs:
+            tiles.extend(self.offgrid_index.get(id_pair, ()))
+        return tiles
+
+    # cells blocked by an offgrid tile, offgrid tiles only collide when aligned to the grid (see Collider)
+    def obstacle_cells(self, tile):
+        physics = self.registry.physics[self.registry.tile_id(tile.type, tile.variant)]
+        if physics is None or tile.pos[0] % self.tile_size or tile.pos[1] % self.tile_size:
+            return []
+        width, height, vertical_offset = physics
+        if not width or not height:
+            return []
+        top = tile.pos[1] + vertical_offset
+        return [(x, y) for x in range(int(tile.pos[0] // self.tile_size), int((tile.pos[0] + width - 1) // self.tile_size) + 1)
+                for y in range(int(top // self.tile_size), int((top + height - 1) // self.tile_size) + 1)]
+
+    def add_obstacle(self, tile):
+        cells = self.obstacle_cells(tile)
+        for cell in cells:
+            self.obstacles[cell] = self.obstacles.get(cell, 0) + 1
+        return cells
+
+    def remove_obstacle(self, tile):
+        cells = self.obstacle_cells(tile)
+        for cell in cells:
+            self.obstacles[cell] -= 1
+            if not self.obstacles[cell]:
+                del self.obstacles[cell]
+        return cells
+
+    # build the dense flag grid covering all tiles, border and obstacles
+    def compile_grid(self):
+        self.obstacles = {}
         for tile in self.offgrid_tiles:
-            if tile['pos'] == pos and tile['type'] in PHYSICS_TILES:
-                return tile
-
-    # define which of the surrounding tiles have physics enabled
-    def physics_rects_around(self, pos):
-        rects = []
-        for tile in self.tiles_around(pos):
-            if tile['type'] in PHYSICS_TILES:
-                rects.append(pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size + PHYSICS_TILES[tile['type']][tile['variant']][2], PHYSICS_TILES[tile['type']][tile['variant']][0], PHYSICS_TILES[tile['type']][tile['variant']][1]))
-            if tile['pos'] in self.border:
-                rects.append(pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size, self.tile_size))
-        return rects
-
-    # auto tiling and border generation
+            self.add_obstacle(tile)
+
+        cells = [tile.pos for tile in self.tilemap.values()] + list(self.border) + list(self.obstacles)
+        if cells:
+            min_x = min(cell[0] for cell in cells) - GRID_MARGIN
+            min_y = min(cell[1] for cell in cells) - GRID_MARGIN
+            max_x = max(cell[0] for cell in cells) + GRID_MARGIN
+            max_y = max(cell[1] for cell in cells) + GRID_MARGIN
+        else:
+            min_x, min_y, max_x, max_y = -GRID_MARGIN, -GRID_MARGIN, GRID_MARGIN, GRID_MARGIN
+        self.grid_x = min_x
+        self.grid_y = min_y
+        self.grid_width = max_x - min_x + 1
+        self.grid_height = max_y - min_y + 1
+        self.cell_flags = bytearray(self.grid_width * self.grid_height)
+        self.cell_ids = array('i', [-1]) * (self.grid_width * self.grid_height)
+
+        flags = self.cell_flags
+        ids = self.registry.ids
+        solid = self.registry.solid
+        for tile in self.tilemap.values():
+            i = (tile.pos[1] - min_y) * self.grid_width + tile.pos[0] - min_x
+            tile_id = ids[(tile.type, tile.variant)]
+            self.cell_ids[i] = tile_id
+            flags[i] |= CELL_GROUND | (CELL_SOLID if solid[tile_id] else 0)
+        for loc in self.border:
+            flags[(loc[1] - min_y) * self.grid_width + loc[0] - min_x] |= CELL_SOLID
+        for cell in self.obstacles:
+            flags[(cell[1] - min_y) * self.grid_width + cell[0] - min_x] |= CELL_SOLID | CELL_OBSTACLE
+
+    # recompute the flags of a single cell after an edit
+    def refresh_cell(self, cell):
+        x = cell[0] - self.grid_x
+        y = cell[1] - self.grid_y
+        if not (0 <= x < self.grid_width and 0 <= y < self.grid_height):
+            self.compile_grid()     # edit outside of the grid, grow it
+            return
+        flags = 0
+        tile_id = -1
+        tile = self.tilemap.get(str(cell[0]) + ';' + str(cell[1]))
+        if tile is not None:
+            tile_id = self.registry.tile_id(tile.type, tile.variant)
+            flags |= CELL_GROUND | (CELL_SOLID if self.registry.solid[tile_id] else 0)
+        if (cell[0], cell[1]) in self.border:
+            flags |= CELL_SOLID
+        if (cell[0], cell[1]) in self.obstacles:
+            flags |= CELL_SOLID | CELL_OBSTACLE
+        self.cell_flags[y * self.grid_width + x] = flags
+        self.cell_ids[y * self.grid_width + x] = tile_id
+
+    def cell_flag(self, x, y):
+        x -= self.grid_x
+        y -= self.grid_y
+        if 0 <= x < self.grid_width and 0 <= y < self.grid_height:
+            return self.cell_flags[y * self.grid_width + x]
+        return 0
+
+    # cell can be walked on: there is ground and nothing blocks it
+    def walkable(self, cell):
+        return self.cell_flag(cell[0], cell[1]) & (CELL_GROUND | CELL_SOLID) == CELL_GROUND
+
+    # edit the map, keeps the compiled grid and the render entries up to date
+    def set_tile(self, loc, tile):
+        key = str(loc[0]) + ';' + str(loc[1])
+        old = self.tilemap.get(key)
+        self.tilemap[key] = tile
+        self.refresh_cell((loc[0], loc[1]))
+        self.notify('tiles', [((loc[0], loc[1]), old, tile)])
+        return old
+
+    def remove_tile(self, loc):
+        tile = self.tilemap.pop(str(loc[0]) + ';' + str(loc[1]), None)
+        if tile is not None:
+            self.refresh_cell((loc[0], loc[1]))
+            self.notify('tiles', [((loc[0], loc[1]), tile, None)])
+        return tile
+
+    # edit many cells in one batch, changes maps (x, y) to a Tile or None (erase)
+    # the grid is refreshed (or grown) once, autotile runs once over all cells and listeners get a single event
+    # returns the applied (loc, old, new) changes
+    def set_tiles(self, changes, autotile=True):
+        applied = []
+        for loc, tile in changes.items():
+            key = str(loc[0]) + ';' + str(loc[1])
+            old = self.tilemap.get(key)
+            if tile is None:
+                if old is None:
+                    continue
+                del self.tilemap[key]
+            else:
+                self.tilemap[key] = tile
+            applied.append(((loc[0], loc[1]), old, tile))
+        if not applied:
+            return applied
+
+        cells = [change[0] for change in applied]
+        if all(0 <= x - self.grid_x < self.grid_width and 0 <= y - self.grid_y < self.grid_height for x, y in cells):
+            for cell in cells:
+                self.refresh_cell(cell)
+        else:
+            self.compile_grid()
+        self.notify('tiles', applied)
+        if autotile:
+            self.autotile_cells(cells)
+        return applied
+
+    def add_offgrid(self, tile):
+        self.add_offgrids([tile])
+
+    def remove_offgrid(self, tile):
+        self.remove_offgrids([tile])
+
+    # add / remove many offgrid tiles, every collection is updated once per batch
+    def add_offgrids(self, tiles):
+        if not tiles:
+            return
+        changed_cells = set()
+        for tile in tiles:
+            self.offgrid_tiles.append(tile)
+            self.offgrid_index.setdefault((tile.type, tile.variant), []).append(tile)
+            self.render_entries.append(self.render_entry(tile))
+            changed_cells.update(self.add_obstacle(tile))
+        for cell in changed_cells:
+            self.refresh_cell(cell)
+        self.notify('offgrid', tiles, True)
+
+    def remove_offgrids(self, tiles):
+        if not tiles:
+            return
+        removed = {id(tile) for tile in tiles}
+        removed_pos = {id(tile.pos) for tile in tiles}
+        self.offgrid_tiles = [tile for tile in self.offgrid_tiles if id(tile) not in removed]
+        for id_pair in {(tile.type, tile.variant) for tile in tiles}:
+            self.offgrid_index[id_pair] = [tile for tile in self.offgrid_index[id_pair] if id(tile) not in removed]
+        self.render_entries = [entry for entry in self.render_entries if id(entry.pos) not in removed_pos]
+        changed_cells = set()
+        for tile in tiles:
+            changed_cells.update(self.remove_obstacle(tile))
+        for cell in changed_cells:
+            self.refresh_cell(cell)
+        self.notify('offgrid', tiles, False)
+
+    # ground or an obstacle at pos (pixels)
+    def solid_check(self, pos):
+        return bool(self.cell_flag(int(pos[0] // self.tile_size), int(pos[1] // self.tile_size)) & (CELL_GROUND | CELL_OBSTACLE))
+
+    # auto tiling and border generation for the whole map
     def autotile(self):
-        self.border = []    # reset border to get rid of old border elements
+        self.border = set()     # reset border to get rid of old border elements
         for loc in self.tilemap:
             tile = self.tilemap[loc]
             neighbors = set()
-            for shift in [(1,0), (-1,0), (0,1), (0,-1)]:
-                check_loc = str(tile['pos'][0] + shift[0]) + ';' + str(tile['pos'][1] + shift[1])
+            for shift in AUTOTILE_SHIFTS:
+                check_loc = str(tile.pos[0] + shift[0]) + ';' + str(tile.pos[1] + shift[1])
                 if check_loc in self.tilemap:
-                    if self.tilemap[check_loc]['type'] == tile['type']:     # check if the adjacent tile is of the same type
+                    if self.tilemap[check_loc].type == tile.type:     # check if the adjacent tile is of the same type
                         neighbors.add(shift)
-                else:                                                       # add position to border if no tile is found (convert loc string to int list)
-                    self.border.append([int(check_loc.split(';')[0]), int(check_loc.split(';')[1])])
+                else:                                                       # add position to border if no tile is found
+                    self.border.add((tile.pos[0] + shift[0], tile.pos[1] + shift[1]))
             neighbors = tuple(sorted(neighbors))
-            if (tile['type'] in AUTOTILE_TYPES) and (neighbors in AUTOTILE_MAP):
-                tile['variant'] = AUTOTILE_MAP[neighbors]
-
-        print(self.offgrid_tiles)
+            if (tile.type in AUTOTILE_TYPES) and (neighbors in AUTOTILE_MAP):
+                tile.variant = AUTOTILE_MAP[neighbors]
+        self.compile_grid()
+        self.notify('reset')
+
+    # incremental autotile after editing cells: only the edited cells and their four neighbors are re-resolved
+    # returns the cells whose variant or border state changed
+    def autotile_cells(self, cells):
+        affected = set()
+        for cell in cells:
+            affected.add((cell[0], cell[1]))
+            for shift in AUTOTILE_SHIFTS:
+                affected.add((cell[0] + shift[0], cell[1] + shift[1]))
+
+        changed = []
+        for cell in affected:
+            tile = self.tilemap.get(str(cell[0]) + ';' + str(cell[1]))
+            if tile is None:
+                # empty cells next to a tile are border
+                is_border = any(str(cell[0] + shift[0]) + ';' + str(cell[1] + shift[1]) in self.tilemap for shift in AUTOTILE_SHIFTS)
+                if is_border != (cell in self.border):
+                    self.set_border(cell, is_border)
+                    changed.append(cell)
+                continue
+
+            if cell in self.border:
+                self.set_border(cell, False)
+                changed.append(cell)
+            if tile.type in AUTOTILE_TYPES:
+                neighbors = []
+                for shift in AUTOTILE_SHIFTS:
+                    neighbor = self.tilemap.get(str(cell[0] + shift[0]) + ';' + str(cell[1] + shift[1]))
+                    if neighbor is not None and neighbor.type == tile.type:
+                        neighbors.append(shift)
+                neighbors = tuple(sorted(neighbors))
+                if neighbors in AUTOTILE_MAP and tile.variant != AUTOTILE_MAP[neighbors]:
+                    self.set_variant(cell, AUTOTILE_MAP[neighbors])
+                    changed.append(cell)
+        return changed
+
+    def set_variant(self, loc, variant):
+        tile = self.tilemap[str(loc[0]) + ';' + str(loc[1])]
+        old = tile.variant
+        tile.variant = variant
+        self.refresh_cell((loc[0], loc[1]))
+        self.notify('variant', (loc[0], loc[1]), old, variant)
+
+    def set_border(self, loc, is_border):
+        cell = (loc[0], loc[1])
+        if is_border:
+            self.border.add(cell)
+        else:
+            self.border.discard(cell)
+        self.refresh_cell(cell)
+        self.notify('border', cell, is_border)
 
     # place tile TBA on the border only for debugging for now
     def show_border(self):
         for loc in self.border:
-            self.border_tiles.append({'type': 'grass', 'variant': 0, 'pos': loc})
+            self.border_tiles.append(Tile('grass', 0, loc))
         print(self.border)
+        self.notify('reset')
 
     def render_progress_bar(self, surf, progress):
         black = (0, 0, 0)
@@ -285,78 +422,53 @@ class Tilemap:
     # render tilemap and offgrid tiles, the order sets what is in front and what in the back, offset used for cam
     # render all for editor
     def render(self, surf, offset=(0, 0)):
+        self.render_back(surf, offset=offset)
 
-        # only render tiles that appear on screen (improves performance)
-        for x in range(offset[0] // self.tile_size, (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surf.get_height()) // self.tile_size + 1):
-                location = str(x) + ';' + str(y)
-                if location in self.tilemap:
-                    tile = self.tilemap[location]
-                    surf.blit(self.game.assets[tile['type']][tile['variant']],
-                              (tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
-
-        for tile in self.offgrid_tiles:
-            surf.blit(self.game.assets[tile['type']][tile['variant']], (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1]))
-
-        for tile in self.border_tiles:
-            surf.blit(self.game.assets[tile['type']][tile['variant']],
-                      (tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
+        image = self.registry.image
+        surf.blits([(image(tile.type, tile.variant), (tile.pos[0] - offset[0], tile.pos[1] - offset[1])) for tile in self.offgrid_tiles], False)
+        surf.blits([(image(tile.type, tile.variant), (tile.pos[0] * self.tile_size - offset[0], tile.pos[1] * self.tile_size - offset[1]))
+                    for tile in self.border_tiles], False)
 
     # render tiles behind player
+    # only render tiles that appear on screen (improves performance), the tile ids come from the compiled grid
     def render_back(self, surf, offset=(0, 0), player_pos=(0, 0)):
-
-        # only render tiles that appear on screen (improves performance)
-        for x in range(offset[0] // self.tile_size, (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surf.get_height()) // self.tile_size + 1):
-                location = str(x) + ';' + str(y)
-                #print(y, player_pos[0] // self.tile_size)
-                if location in self.tilemap: # and y <= (player_pos[1] // self.tile_size + 1):
-                    tile = self.tilemap[location]
-                    surf.blit(self.game.assets[tile['type']][tile['variant']],
-                              (tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
-
-    def render_order_offgrid(self, surf, offset=(0, 0)):
-        render_list = []
-
-        '''
-        #only take visible tiles
-        for x in range(offset[0] // self.tile_size, (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surf.get_height()) // self.tile_size + 1):
-                location_offgrid = [x * self.tile_size, y * self.tile_size]'''
-
-        for tile in self.offgrid_tiles:
-            tile_copy = tile.copy()
-            tile_copy['pos_adj'] = tile_copy['pos'][0] - offset[0], tile_copy['pos'][1] - offset[1] + FRONT_BACK_OFFSET[tile_copy['type']][tile['variant']]
-            render_list.append(tile_copy)
-
-        return render_list
+        tile_size = self.tile_size
+        images = self.registry.images
+        ids = self.cell_ids
+        blits = []
+        for x in range(max(offset[0] // tile_size, self.grid_x), min((offset[0] + surf.get_width()) // tile_size + 1, self.grid_x + self.grid_width)):
+            i = x - self.grid_x
+            for y in range(max(offset[1] // tile_size, self.grid_y), min((offset[1] + surf.get_height()) // tile_size + 1, self.grid_y + self.grid_height)):
+                tile_id = ids[(y - self.grid_y) * self.grid_width + i]
+                if tile_id >= 0:
+                    blits.append((images[tile_id], (x * tile_size - offset[0], y * tile_size - offset[1])))
+        surf.blits(blits, False)
+
+    # render entries of offgrid tiles only depend on the tile, so they are built once instead of copied every frame
+    def rebuild_render_entries(self):
+        self.render_entries = [self.render_entry(tile) for tile in self.offgrid_tiles]
+
+    def render_entry(self, tile):
+        depth_offset = self.registry.depth_offsets[self.registry.tile_id(tile.type, tile.variant)]
+        return RenderEntry(tile.type, tile.pos[1] + depth_offset, pos=tile.pos, variant=tile.variant)
+
+    def render_order_offgrid(self):
+        return list(self.render_entries)
 
     def render_object(self, surf, type, variant, pos, offset=(0, 0)):
-        surf.blit(self.game.assets[type][variant], (pos[0] - offset[0], pos[1] - offset[1]))
+        surf.blit(self.registry.image(type, variant), (pos[0] - offset[0], pos[1] - offset[1]))
 
     def get_knn(self):
-        knn_tiles = []
-        for tile in self.offgrid_tiles:
-            if tile['type'] == 'decor':
-                if tile['variant'] == 2 or tile['variant'] == 3 or tile['variant'] == 4:
-                    knn_tiles.append(tile)
-        return knn_tiles
-
+        return self.tiles_of(('decor', 2), ('decor', 3), ('decor', 4))
 
     def get_totems(self, level):
-        totem_tiles=[]
-        for tile in self.offgrid_tiles:
-            if tile['type'] == 'decor':
-                if tile['variant'] == 0:
-                    #tile['dialogue'] = False
-                    totem_tiles.append(tile)
-        for index, tile in enumerate(totem_tiles):
-            if level == 1:
-                tile["index"] = index
+        totems = []
+        for index, tile in enumerate(self.tiles_of(('decor', 0))):
             if level == 2:
-                tile["index"] = index + 4
+                index += 4
+            totems.append(Totem(tile.pos, index))
 
-        return totem_tiles
+        return totems
 
 
 
@@ -0,0 +1,60 @@
+CELL_SIZE = 64     # pixels, zones are registered in every cell their circle's bounding box touches
+
+
+class Zone:
+    __slots__ = ('owner', 'kind', 'pos', 'radius')
+
+    def __init__(self, owner, kind, pos, radius):
+        self.owner = owner
+        self.kind = kind
+        self.pos = (pos[0], pos[1])
+        self.radius = radius
+
+    def contains(self, pos):
+        return (pos[0] - self.pos[0]) ** 2 + (pos[1] - self.pos[1]) ** 2 < self.radius ** 2
+
+
+# circular zones around static objects (npcs, totems) registered at level load in a spatial grid
+# update looks only at the zones of the player's cell and tells the listeners when the player enters or leaves one
+class TriggerZones:
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}         # (x, y): zones touching the cell
+        self.inside = []        # zones the player is in, in the order they were entered
+        self.last_pos = None
+        self.listeners = []     # called with ('enter' | 'exit', zone)
+
+    def clear(self):
+        self.cells = {}
+        self.inside = []
+        self.last_pos = None
+
+    def add(self, owner, kind, pos, radius):
+        zone = Zone(owner, kind, pos, radius)
+        for x in range(int((zone.pos[0] - radius) // self.cell_size), int((zone.pos[0] + radius) // self.cell_size) + 1):
+            for y in range(int((zone.pos[1] - radius) // self.cell_size), int((zone.pos[1] + radius) // self.cell_size) + 1):
+                self.cells.setdefault((x, y), []).append(zone)
+        return zone
+
+    def notify(self, event, zone):
+        for listener in self.listeners:
+            listener(event, zone)
+
+    # player position (pixels), fires the events of the zone boundaries crossed since the last update
+    def update(self, pos):
+        pos = (pos[0], pos[1])
+        if pos == self.last_pos:
+            return
+        self.last_pos = pos
+        zones = self.cells.get((int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)), ())
+        now = [zone for zone in zones if zone.contains(pos)]
+        if not now and not self.inside:
+            return
+
+        left = [zone for zone in self.inside if zone not in now]
+        entered = [zone for zone in now if zone not in self.inside]
+        self.inside = [zone for zone in self.inside if zone in now] + entered
+        for zone in left:
+            self.notify('exit', zone)
+        for zone in entered:
+            self.notify('enter', zone)
@@ -1,6 +1,7 @@
 import pygame
 import os
-import math
+
+from scripts.knn import GROUP_ONE, GROUP_TWO
 
 BASE_IMG_PATH = 'data/images/'
 
@@ -31,6 +32,8 @@ def load_images(path, background=(0, 0, 0)):
 
 
 class Animation:
+    __slots__ = ('images', 'img_duration', 'loop', 'done', 'frame')
+
     def __init__(self, images, img_dur=5, loop=True):
         self.images = images
         self.img_duration = img_dur
@@ -72,10 +75,11 @@ class DialogueHandler:
         self.current_line_index = 0
         self.dialogue_active = True
 
-    def start_totem_dialogue(self, dialogue_index):
+    def start_totem_dialogue(self, dialogue_index, knn_board=None, knn_target=None):
         """
         Start the totem dialogue.
         dialogue_data is expected to be a dict with question, options, and responses.
+        The knn questions are checked against knn_board (KnnBoard) classifying knn_target.
         """
         if dialogue_index in self.totemid_solved:
             self.choices=[]
@@ -87,6 +91,8 @@ class DialogueHandler:
             self.dialogue_lines = [totem_data[dialogue_index]['question']]
             self.choices = totem_data[dialogue_index]['options']
             self.correct = totem_data[dialogue_index]["correct"]
+            if 'k' in totem_data[dialogue_index] and knn_board is not None and knn_target is not None:
+                self.correct = KNN_OPTIONS[knn_board.classify(totem_data[dialogue_index]['k'], knn_target)]
             self.response = totem_data[dialogue_index]['response']
             self.dialogue_active = True
             self.current_line_index = 0
@@ -324,6 +330,9 @@ npc_dialogue = {
     "totem5": ["for knn with k=13 the red lantern is classified as big"],
 }
 
+# knn totems ('k' in their data) are answered from the lantern board of the level when it has one
+KNN_OPTIONS = {GROUP_TWO: '1', GROUP_ONE: '2'}     # group: option, small lanterns (decor 2) are group one
+
 totem_data = {
     0:{'question': "Let's see if you are worthy! Here's a small test: In supervised learning, the model is trained only on unlabeled data.",
     'options': [
@@ -371,6 +380,7 @@ totem_data = {
     'correct': "2"
     },
     4:{'question': "What class would our new sample lantern be predicted as if k=1?",
+    'k': 1,
     'options': [
         "Option 1: Class big lantern",
         "Option 2: Class small lantern",
@@ -386,6 +396,7 @@ totem_data = {
     'correct': "1"
     },
     6:{'question': "What class would our new sample lantern be predicted as if k=3?",
+    'k': 3,
     'options': [
         "Option 1: Class big lantern",
         "Option 2: Class small lantern",
@@ -399,6 +410,7 @@ totem_data = {
     'correct': "2"
     },
     7:{'question': "What class would our new sample lantern be predicted as if k=7?",
+    'k': 7,
     'options': [
         "Option 1: Class big lantern",
         "Option 2: Class small lantern",
@@ -412,6 +424,7 @@ totem_data = {
     'correct': "2"
     },
     5:{'question': "What class would our new sample lantern be predicted as if k=13?",
+    'k': 13,
     'options': [
         "Option 1: Class big lantern",
         "Option 2: Class small lantern",
@@ -426,21 +439,23 @@ totem_data = {
     }
 }
 
-def render_proximity(self, player_pos, screen, render_cam_offset):
-    distance = math.sqrt((self["pos"][0] - player_pos[0]) ** 2 + (self["pos"][1] - player_pos[1]) ** 2)
-    font = pygame.font.SysFont('Arial', 15)
-    if distance < 40:
-        self["dialogue"] = True
-        text_surface = font.render('Press N', True, (255, 255, 255))
+prompt_surfaces = {}    # (text, size): rendered prompt, creating the font is slow
+
 
-        # Translate the NPC's world position into camera-relative screen position
-        text_x = self["pos"][0] * 4 - render_cam_offset[0] * 4 + 30
-        text_y = self["pos"][1] * 4 - render_cam_offset[1] * 4 + 80  # Adjust the offset as needed
+# prompt text next to an object, pos in world pixels (the screen is 4 times the display size)
+def render_prompt(screen, text, size, pos, render_cam_offset, text_offset):
+    text_surface = prompt_surfaces.get((text, size))
+    if text_surface is None:
+        text_surface = pygame.font.SysFont('Arial', size).render(text, True, (255, 255, 255))
+        prompt_surfaces[(text, size)] = text_surface
 
-        text_rect = text_surface.get_rect(center=(text_x, text_y))
-        screen.blit(text_surface, text_rect)
-    else:
-        self["dialogue"] = False
+    # Translate the object's world position into camera-relative screen position
+    text_x = pos[0] * 4 - render_cam_offset[0] * 4 + text_offset[0]
+    text_y = pos[1] * 4 - render_cam_offset[1] * 4 + text_offset[1]
 
+    text_rect = text_surface.get_rect(center=(text_x, text_y))
+    screen.blit(text_surface, text_rect)
 
 
+def render_totem_prompt(pos, screen, render_cam_offset):
+    render_prompt(screen, 'Press N', 15, pos, render_cam_offset, (30, 80))
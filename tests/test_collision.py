@@ -0,0 +1,58 @@
+from scripts.collision import Collider, COLLIDE_DOWN, COLLIDE_RIGHT
+from scripts.records import Tile
+from scripts.registry import TILE_TYPES, PHYSICS_TILES
+from scripts.tilemap import Tilemap
+
+
+class Game:
+    # one placeholder image per variant, the collider only needs the physics tables of the registry
+    assets = {tile_type: [None] * (max(PHYSICS_TILES[tile_type]) + 1 if tile_type in PHYSICS_TILES else 1) for tile_type in TILE_TYPES}
+
+
+class Entity:
+    def __init__(self, pos, size):
+        self.pos = list(pos)
+        self.size = size
+        self.collisions = 0
+
+
+def make_collider(tiles):
+    tilemap = Tilemap(Game())
+    for loc, (tile_type, variant) in tiles.items():
+        tilemap.set_tile(loc, Tile(tile_type, variant, loc))
+    return Collider(tilemap)
+
+
+# water variant 0 blocks the top half of its cell: (16 * x, 16 * y, 16, 8)
+
+
+def test_rect_on_the_way_stops_a_fast_entity():
+    collider = make_collider({(3, 0): ('water', 0)})
+    entity = Entity((0, 0), (8, 8))
+    assert collider.move(entity, (60, 0)) == COLLIDE_RIGHT
+    assert entity.pos == [40, 0]
+
+
+def test_overlapped_rect_pushes_the_entity_out():
+    collider = make_collider({(0, 1): ('water', 0)})
+    entity = Entity((0, 12), (8, 8))   # half inside the rect at y 16 - 24
+    assert collider.move(entity, (0, 1)) == COLLIDE_DOWN
+    assert entity.pos == [0, 8]
+
+
+def test_free_position_moves_out_of_rects():
+    collider = make_collider({(0, 1): ('water', 0), (1, 1): ('water', 0)})
+    assert collider.free_position((4, 18), (8, 8)) == [4, 24]
+    assert collider.free_position((4, 40), (8, 8)) == [4, 40]
+
+
+def test_move_many_matches_move():
+    tiles = {(x, 2): ('water', 0) for x in range(8)}
+    entities = [Entity((x * 10, 0), (8, 8)) for x in range(6)]
+    singles = [Entity(entity.pos, entity.size) for entity in entities]
+    movements = [(3, 40), (0, 0), (-4, 38), (5, -2), (0, 60), (12, 12)]
+    collider = make_collider(tiles)
+    contacts = collider.move_many(entities, movements)
+    assert contacts == [collider.move(entity, movement) for entity, movement in zip(singles, movements)]
+    assert [entity.pos for entity in entities] == [entity.pos for entity in singles]
+    assert COLLIDE_DOWN in contacts
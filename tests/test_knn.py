@@ -0,0 +1,33 @@
+import numpy as np
+
+from scripts.knn import KnnBoard, GROUP_ONE, GROUP_TWO
+from scripts.records import Tile
+
+
+def test_tie_at_kth_distance_takes_group_one():
+    board = KnnBoard(group_one=[(1, 0)], group_two=[(-1, 0), (0, 5)])
+    assert board.classify(1, (0, 0)) == GROUP_ONE
+    assert board.classify_many(1, [(0, 0)])[0] == GROUP_ONE
+    assert board.classify(2, (0, 0)) == GROUP_TWO
+    assert board.classify_many(2, [(0, 0)])[0] == GROUP_TWO
+
+
+def test_classify_many_matches_classify_on_ties():
+    rng = np.random.default_rng(0)
+    # integer grid points, most targets have several points at the same distance
+    group_one = rng.integers(0, 6, (12, 2))
+    group_two = rng.integers(0, 6, (12, 2))
+    board = KnnBoard(group_one, group_two)
+    targets = rng.integers(0, 6, (40, 2))
+    for k in range(1, 27):
+        assert list(board.classify_many(k, targets)) == [board.classify(k, target) for target in targets]
+
+
+def test_board_from_lantern_tiles():
+    tiles = [Tile('decor', 4, (0, 0)), Tile('decor', 2, (16, 0)), Tile('decor', 3, (32, 0)), Tile('decor', 3, (48, 0))]
+    board, target = KnnBoard.from_tiles(tiles)
+    assert target == (0, 0)
+    assert board.classify(1, target) == GROUP_ONE
+    assert board.classify(3, target) == GROUP_TWO
+    assert board.classify(13, target) == GROUP_TWO     # k above the board size takes every lantern
+    assert board.classify(0, target) == GROUP_TWO
@@ -0,0 +1,82 @@
+import os
+import random
+
+from scripts.collision import Collider
+from scripts.entities import Enemy
+from scripts.navigation import FlowField, CHASE_DISTANCE
+from scripts.records import Tile
+from scripts.registry import TILE_TYPES
+from scripts.tilemap import Tilemap
+from scripts.utils import Animation
+
+TILE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'images', 'tiles')
+
+
+class Assets(dict):
+    # placeholder images for the tiles, a one frame animation for every entity action
+    def __missing__(self, key):
+        return Animation([None])
+
+
+class Game:
+    def __init__(self):
+        self.assets = Assets({tile_type: [None] * len(os.listdir(os.path.join(TILE_DIR, tile_type))) for tile_type in TILE_TYPES})
+        self.rng = random.Random(0)
+        self.tilemap = Tilemap(self)
+        # 40 x 20 cells of grass with a water wall at x = 10 open only at y = 15
+        self.tilemap.set_tiles({(x, y): Tile('water' if x == 10 and y != 15 else 'grass', 0, (x, y)) for x in range(40) for y in range(20)},
+                               autotile=False)
+        self.collider = Collider(self.tilemap)
+        self.flow_field = FlowField(self.tilemap, budget=50)
+
+
+def converge(flow_field, pos):
+    for frame in range(100):
+        flow_field.update(pos)
+        if flow_field.pending_target is None:
+            return frame + 1
+    raise AssertionError('flow field did not converge')
+
+
+def test_field_converges_over_frames_and_leads_to_the_target():
+    game = Game()
+    field = game.flow_field
+    target = (5, 5)
+    assert converge(field, (target[0] * 16 + 8, target[1] * 16 + 8)) > 1     # spread over several frames by the budget
+    assert field.target == target
+
+    # following the steps reaches the target from every cell of the field, around the wall through the gap
+    for cell in field.directions:
+        for _ in range(CHASE_DISTANCE):
+            if cell == target:
+                break
+            step = field.directions[cell]
+            cell = (cell[0] + step[0], cell[1] + step[1])
+            assert game.tilemap.walkable(cell)
+        assert cell == target
+    assert field.next_step((12 * 16, 5 * 16)) is None        # behind the wall, the way round is too long
+    assert field.next_step((5 * 16 + 8 + 16 * (CHASE_DISTANCE + 1), 5 * 16)) is None
+
+
+def test_old_field_is_used_until_the_new_one_is_done():
+    game = Game()
+    field = game.flow_field
+    converge(field, (5 * 16, 5 * 16))
+    field.update((7 * 16, 5 * 16))
+    assert field.pending_target == (7, 5) and field.target == (5, 5)
+    assert field.next_step((6 * 16, 5 * 16)) == (-1, 0)
+    converge(field, (7 * 16, 5 * 16))
+    assert field.next_step((6 * 16, 5 * 16)) == (1, 0)
+
+
+def test_enemies_in_range_step_towards_the_player():
+    game = Game()
+    player = (5 * 16 + 8, 5 * 16 + 8)
+    converge(game.flow_field, player)
+    near = Enemy(game, (9 * 16, 5 * 16 - 34), (16, 35))      # feet in cell (9, 5)
+    far = Enemy(game, (30 * 16, 5 * 16 - 34), (16, 35))
+    for _ in range(60):
+        for enemy in (near, far):
+            game.collider.move(enemy, enemy.frame_movement(enemy.plan(game.tilemap, (0, 0))))
+    assert near.pos[0] < 9 * 16 - 20                            # walked towards the player
+    assert abs(far.pos[0] - 30 * 16) <= 30                      # out of range, only wandering around
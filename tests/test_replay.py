@@ -0,0 +1,30 @@
+import pygame
+
+from scripts.replay import ReplayRecorder, ReplayPlayer
+
+
+def test_record_replay_round_trip(tmp_path):
+    path = str(tmp_path / 'session.rpl')
+    recorder = ReplayRecorder(path, -1, level=2)
+    recorder.record(0, [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_d), pygame.event.Event(pygame.MOUSEMOTION, pos=(1, 2))])
+    recorder.record(3, [pygame.event.Event(pygame.KEYUP, key=pygame.K_d), pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1)])
+    recorder.record(7, [])
+    recorder.close()
+
+    player = ReplayPlayer(path)
+    assert (player.seed, player.level, player.frames) == (-1, 2, 8)
+    assert [(event.type, event.key) for event in player.get(0)] == [(pygame.KEYDOWN, pygame.K_d)]
+    assert [(event.type, getattr(event, 'key', None), getattr(event, 'button', None)) for event in player.get(3)] == \
+        [(pygame.KEYUP, pygame.K_d, None), (pygame.MOUSEBUTTONDOWN, None, 1)]
+    assert player.get(5) == [] and not player.done(7) and player.done(8)
+
+
+def test_interrupted_recording_plays_until_the_last_event(tmp_path):
+    path = str(tmp_path / 'session.rpl')
+    recorder = ReplayRecorder(path, 2 ** 62)
+    recorder.record(4, [pygame.event.Event(pygame.QUIT)])
+    recorder.file.close()   # no END record
+
+    player = ReplayPlayer(path)
+    assert player.seed == 2 ** 62 and player.frames == 5
+    assert [event.type for event in player.get(4)] == [pygame.QUIT]
@@ -0,0 +1,57 @@
+import os
+
+from scripts.records import Tile
+from scripts.registry import TILE_TYPES
+from scripts.tilemap import Tilemap, CELL_GROUND, CELL_SOLID, CELL_OBSTACLE
+
+
+TILE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'images', 'tiles')
+
+
+class Game:
+    # a placeholder per tile image, the tilemap only needs the variant counts and physics tables of the registry
+    assets = {tile_type: [None] * len(os.listdir(os.path.join(TILE_DIR, tile_type))) for tile_type in TILE_TYPES}
+
+
+def test_extract_grid_spawner():
+    tilemap = Tilemap(Game())
+    tilemap.set_tile((2, 3), Tile('spawners', 0, (2, 3)))
+    tilemap.set_tile((4, 3), Tile('grass', 0, (4, 3)))
+    matches = tilemap.extract([('spawners', 0)])
+    assert [(match.type, match.variant, match.pos) for match in matches] == [('spawners', 0, [32, 48])]
+    assert '2;3' not in tilemap.tilemap and '4;3' in tilemap.tilemap
+    assert tilemap.cell_flag(2, 3) == 0
+    assert tilemap.cell_flag(4, 3) == CELL_GROUND
+
+
+def test_extract_keep():
+    tilemap = Tilemap(Game())
+    tilemap.set_tile((2, 3), Tile('spawners', 1, (2, 3)))
+    tilemap.add_offgrid(Tile('spawners', 1, (5.5, 7.25)))
+    matches = tilemap.extract([('spawners', 1)], keep=True)
+    assert sorted(match.pos for match in matches) == [[5.5, 7.25], [32, 48]]
+    assert '2;3' in tilemap.tilemap and len(tilemap.offgrid_tiles) == 1
+    assert tilemap.cell_flag(2, 3) & CELL_GROUND and not tilemap.cell_flag(2, 3) & CELL_SOLID
+
+
+def test_cell_flags_follow_edits():
+    tilemap = Tilemap(Game())
+    tilemap.set_tile((0, 0), Tile('grass', 0, (0, 0)))
+    tilemap.set_tile((1, 0), Tile('water', 0, (1, 0)))
+    assert tilemap.cell_flag(0, 0) == CELL_GROUND
+    assert tilemap.cell_flag(1, 0) == CELL_GROUND | CELL_SOLID
+    assert tilemap.solid_check((4, 4)) and not tilemap.walkable((1, 0))
+
+    # a stone placed on the grid blocks its cell until it is removed
+    stone = Tile('stone', 0, (0, 0))
+    tilemap.add_offgrid(stone)
+    assert tilemap.cell_flag(0, 0) == CELL_GROUND | CELL_SOLID | CELL_OBSTACLE
+    tilemap.remove_offgrid(stone)
+    assert tilemap.cell_flag(0, 0) == CELL_GROUND
+
+    tilemap.remove_tile((1, 0))
+    assert tilemap.cell_flag(1, 0) == 0 and not tilemap.solid_check((20, 4))
+
+    # edits outside of the compiled grid grow it
+    tilemap.set_tile((100, -50), Tile('grass', 0, (100, -50)))
+    assert tilemap.cell_flag(100, -50) == CELL_GROUND and tilemap.cell_flag(0, 0) == CELL_GROUND